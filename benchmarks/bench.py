@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# Offline throughput benchmark of the reader -> filter -> expansion -> dispatch pipeline.
+#
+#   python benchmarks/bench.py --size 2G --json run.json
+#   python benchmarks/bench.py --compare run.json
+#
+# Klipper modules come from the headless stand-ins in harness/klippy, or from a Klipper checkout with --klippy.
+from __future__ import annotations
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generators import MACROS
+from generators import SCENARIOS
+from generators import generate
+from harness import HeadlessPrinter
+from harness import load_loader
+
+SIZE_SUFFIXES = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().upper()
+    if value[-1:] in SIZE_SUFFIXES:
+        return int(float(value[:-1]) * SIZE_SUFFIXES[value[-1]])
+    return int(value)
+
+
+class NoopHandlers(dict):
+    def __init__(self, dispatch: NullDispatch):
+        super().__init__()
+        self.dispatch = dispatch
+
+    def get(self, key, default=None):
+        return dict.get(self, key, self.dispatch.noop)
+
+
+# stands in for klippy GCodeDispatch, every command is accepted and ignored
+class NullDispatch:
+    def __init__(self):
+        self.gcode_handlers = NoopHandlers(self)
+        self.ready_gcode_handlers = self.gcode_handlers
+        self.base_gcode_handlers = {}
+        self.mux_commands = {}
+        self.gcode_help = {}
+        self.dispatched = 0
+
+    def noop(self, _):
+        self.dispatched += 1
+
+    def register_command(self, cmd, func, when_not_ready=False, desc=None):
+        old = dict.get(self.gcode_handlers, cmd)
+        if func is None:
+            self.gcode_handlers.pop(cmd, None)
+        else:
+            self.gcode_handlers[cmd] = func
+        return old
+
+    def register_mux_command(self, cmd, key, value, func, desc=None):
+        self.mux_commands.setdefault(cmd, (key, {}))[1][value] = func
+
+    def cmd_default(self, _):
+        pass
+
+    def respond_info(self, msg, log=True):
+        pass
+
+    def respond_raw(self, msg):
+        pass
+
+
+class BenchPrinter:
+    def __init__(self, dispatch: NullDispatch):
+        self.objects: dict[str, Any] = {'gcode': dispatch}
+
+    def lookup_object(self, name, default=None):
+        return self.objects.get(name, default)
+
+    def register_event_handler(self, event, callback):
+        pass
+
+    def send_event(self, event, *params):
+        return []
+
+
+# minimal config section, enough for Macro
+class BenchConfig:
+    def __init__(self, name: str, options: dict[str, str]):
+        self.name = name
+        self.options = options
+
+    def get_name(self):
+        return self.name
+
+    def get(self, option, default=None):
+        return self.options.get(option, default)
+
+    def get_prefix_options(self, prefix):
+        return [o for o in self.options if o.startswith(prefix)]
+
+
+def build_helper(loader, directory: str, render_cache_size: int):
+    dispatch = NullDispatch()
+    printer = BenchPrinter(dispatch)
+    locator = loader.locator.GCodeLocator(directory)
+    helper = loader.dispatch.GCodeDispatchHelper(printer, dispatch, locator, render_cache_size=render_cache_size)
+    printer.objects['gcode_macro'] = loader.macro.PrinterMacro(helper)
+    for name, gcode in MACROS.items():
+        helper.load_macro(BenchConfig(f'gcode_macro {name}', {'gcode': gcode}))
+    return helper, dispatch
+
+
+def stage_read(loader, helper, file) -> int:
+    lines = 0
+    for _ in loader.iterator.GCodeFileReader(file):
+        lines += 1
+    return lines
+
+
+def stage_parse(loader, helper, file) -> int:
+    lines = 0
+    for line in loader.iterator.GCodeFileReader(file):
+        if line.cmd is not None:
+            _ = line.params
+        lines += 1
+    return lines
+
+
+def stage_filter(loader, helper, file) -> int:
+    lines = 0
+    for line in loader.iterator.CommentFilter(loader.iterator.GCodeFileReader(file)):
+        _ = line.params
+        lines += 1
+    return lines
+
+
+def stage_expand(loader, helper, file) -> int:
+    lines = 0
+    for line in loader.iterator.full_gcode_iterator(loader.iterator.GCodeFileReader(file), helper):
+        _ = line.params
+        lines += 1
+    return lines
+
+
+def stage_dispatch(loader, helper, file) -> int:
+    iterator = loader.iterator.full_gcode_iterator(loader.iterator.GCodeFileReader(file), helper)
+    helper._run_iterator(iterator)
+    return helper._inner.dispatched
+
+
+def write_config(directory: str) -> str:
+    path = os.path.join(directory, 'printer.cfg')
+    with open(path, 'w') as f:
+        f.write(f'[gcode_loader]\nbatch_lines: 32\n\n[virtual_sdcard]\npath: {directory}\n')
+        for name, gcode in MACROS.items():
+            body = ''.join(f'\n    {line}' for line in gcode.splitlines())
+            f.write(f'\n[gcode_macro {name}]\ngcode:{body}\n')
+    return path
+
+
+# whole print through GCodeLoader on the headless printer, including reactor switches and the gcode mutex
+def stage_print(loader, helper, file) -> int:
+    printer = HeadlessPrinter(write_config(os.path.dirname(file.path)))
+    printer.load()
+    printer.run_script(f'SDCARD_PRINT_FILE FILENAME={file.name}')
+    printer.wait_print()
+    return printer.motion.total
+
+
+STAGES: dict[str, Callable[[Any, Any, Any], int]] = {
+    'read': stage_read,
+    'parse': stage_parse,
+    'filter': stage_filter,
+    'expand': stage_expand,
+    'dispatch': stage_dispatch,
+    'print': stage_print,
+}
+
+
+def run_stage(args: argparse.Namespace, scenario: str, stage: str, path: str) -> dict[str, Any]:
+    if stage == 'print' and args.klippy:
+        raise RuntimeError('print stage runs on the headless printer only, drop --klippy')
+    loader = load_loader(args.klippy)
+    helper, _ = build_helper(loader, os.path.dirname(path), args.render_cache_size)
+    file = loader.file.GCodeFile(os.path.dirname(path), os.path.basename(path))
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    gc.collect()
+    collections = [s['collections'] for s in gc.get_stats()]
+    start = time.perf_counter()
+    cpu = time.process_time()
+    lines = STAGES[stage](loader, helper, file)
+    cpu = time.process_time() - cpu
+    elapsed = time.perf_counter() - start
+    collections = [s['collections'] - c for s, c in zip(gc.get_stats(), collections)]
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    size = os.path.getsize(path)
+    return {
+        'scenario': scenario,
+        'stage': stage,
+        'bytes': size,
+        'lines': lines,
+        'seconds': elapsed,
+        'cpu_seconds': cpu,
+        'lines_per_second': lines / elapsed if elapsed > 0 else 0.,
+        'mb_per_second': size / 1024 ** 2 / elapsed if elapsed > 0 else 0.,
+        'gc_collections': collections,
+        'tracemalloc_peak': traced_peak,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def _child(conn, args, scenario, stage, path):
+    try:
+        conn.send(run_stage(args, scenario, stage, path))
+    except BaseException as e:
+        conn.send({'scenario': scenario, 'stage': stage, 'error': f'{type(e).__name__}: {e}'})
+    finally:
+        conn.close()
+
+
+# every stage runs in a fresh process so peak RSS and imports do not leak between measurements
+def run_isolated(args: argparse.Namespace, scenario: str, stage: str, path: str) -> dict[str, Any]:
+    context = multiprocessing.get_context('fork')
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=_child, args=(child, args, scenario, stage, path))
+    process.start()
+    child.close()
+    result = parent.recv()
+    process.join()
+    return result
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_result(result: dict[str, Any], baseline: Optional[dict[str, Any]] = None) -> str:
+    if 'error' in result:
+        return f"{result['scenario']:<14} {result['stage']:<9} ERROR {result['error']}"
+
+    line = (f"{result['scenario']:<14} {result['stage']:<9} {result['lines']:>12,} lines "
+            f"{result['seconds']:>8.2f}s {result['lines_per_second']:>12,.0f} lines/s "
+            f"{result['mb_per_second']:>8.1f} MB/s rss {result['max_rss_kb'] / 1024:>7.1f} MB")
+    if result['tracemalloc_peak'] is not None:
+        line += f" traced {result['tracemalloc_peak'] / 1024 ** 2:.1f} MB"
+    if baseline is not None and 'error' not in baseline and baseline['lines_per_second'] > 0:
+        line += f" ({(result['lines_per_second'] / baseline['lines_per_second'] - 1) * 100:+.1f}%)"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description='gcode_loader pipeline benchmark')
+    parser.add_argument('--klippy', help='path to the klippy directory of a Klipper checkout, '
+                                         'headless stand-ins are used when not set')
+    parser.add_argument('--size', type=parse_size, default=parse_size('256M'),
+                        help='size of every generated file, accepts K/M/G suffixes (default 256M)')
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=None,
+                        help='stages to run, all by default, print requires the headless stand-ins')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'gcode_loader_bench'),
+                        help='directory for generated files, they are reused between runs')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--render-cache-size', type=int, default=32)
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help='trace Python allocations, much slower, use with a smaller --size')
+    parser.add_argument('--json', help='write results to given file')
+    parser.add_argument('--compare', help='results file of a previous run to compare with')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(r['scenario'], r['stage']): r for r in json.load(f)['results']}
+
+    if args.stages is None:
+        args.stages = [stage for stage in STAGES if stage != 'print' or not args.klippy]
+
+    results = []
+    for scenario in args.scenarios:
+        path = generate(args.workdir, scenario, args.size, args.seed)
+        for stage in args.stages:
+            result = run_isolated(args, scenario, stage, path)
+            print(format_result(result, baseline.get((scenario, stage))), flush=True)
+            results.append(result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'meta': {
+                    'revision': git_revision(),
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'time': time.time(),
+                    'size': args.size,
+                    'seed': args.seed,
+                    'render_cache_size': args.render_cache_size,
+                },
+                'results': results,
+            }, f, indent=2)
+
+    if any('error' in r for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+import itertools
+import os
+import random
+from typing import Callable
+from typing import Iterator
+
+WRITE_BLOCK_SIZE = 4 * 1024 * 1024
+
+# macros used by the macro-heavy scenario, name -> gcode
+MACROS = {
+    'BENCH_WIPE': 'G1 X{params.X|default(0)|float + 5} F6000\nG1 X{params.X|default(0)|float - 5}\n',
+    'BENCH_FEATURE': '; {rawparams}\nM204 S{params.ACCEL|default(3000)}\nSET_VELOCITY_LIMIT SQUARE_CORNER_VELOCITY=5\n',
+    'BENCH_LAYER': 'BENCH_FEATURE ACCEL=2000 TYPE=layer\nG92 E0\n',
+}
+INCLUDE_NAME = 'bench_include.gcode'
+
+
+def _moves(rng: random.Random) -> Iterator[str]:
+    e = 0.
+    while True:
+        e += rng.uniform(0.01, 0.2)
+        yield f'G1 X{rng.uniform(0, 300):.3f} Y{rng.uniform(0, 300):.3f} E{e:.5f}\n'
+
+
+def dense_g1(rng: random.Random) -> Iterator[str]:
+    return _moves(rng)
+
+
+def comment_heavy(rng: random.Random) -> Iterator[str]:
+    moves = _moves(rng)
+    for i in itertools.count():
+        yield f'; feature {i} width:{rng.uniform(0.3, 0.6):.3f} height:0.2 some slicer chatter\n'
+        yield '\n'
+        yield next(moves).rstrip('\n') + ' ; inline comment\n'
+
+
+def macro_heavy(rng: random.Random) -> Iterator[str]:
+    moves = _moves(rng)
+    for i in itertools.count():
+        if i % 50 == 0:
+            yield 'BENCH_LAYER\n'
+        yield f'BENCH_FEATURE ACCEL={rng.choice((1000, 2000, 3000))} TYPE=perimeter\n'
+        yield f'BENCH_WIPE X={rng.uniform(10, 290):.1f}\n'
+        for _ in range(4):
+            yield next(moves)
+
+
+def include_heavy(rng: random.Random) -> Iterator[str]:
+    moves = _moves(rng)
+    while True:
+        yield f'SDCARD_PRINT_FILE INCLUDE=1 FILENAME={INCLUDE_NAME}\n'
+        for _ in range(8):
+            yield next(moves)
+
+
+SCENARIOS: dict[str, Callable[[random.Random], Iterator[str]]] = {
+    'dense_g1': dense_g1,
+    'comment_heavy': comment_heavy,
+    'macro_heavy': macro_heavy,
+    'include_heavy': include_heavy,
+}
+
+
+def write_include(directory: str) -> str:
+    path = os.path.join(directory, INCLUDE_NAME)
+    if not os.path.exists(path):
+        with open(path, 'w') as f:
+            f.writelines(itertools.islice(_moves(random.Random(1)), 32))
+    return path
+
+
+# writes scenario file of at least given size, existing files of the same size are reused
+def generate(directory: str, scenario: str, size: int, seed: int = 0) -> str:
+    os.makedirs(directory, exist_ok=True)
+    write_include(directory)
+    path = os.path.join(directory, f'{scenario}-{size}-{seed}.gcode')
+    if os.path.exists(path):
+        return path
+
+    lines = SCENARIOS[scenario](random.Random(seed))
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        written = 0
+        while written < size:
+            block = ''.join(itertools.islice(lines, 4096))
+            f.write(block)
+            written += len(block)
+    os.replace(tmp, path)
+    return path
@@ -0,0 +1 @@
+from .printer import HeadlessPrinter, NullMotion, NullToolhead, load_loader
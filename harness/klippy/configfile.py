@@ -0,0 +1,169 @@
+# Headless stand-in for klippy/configfile.py, reads config files with includes, no autosave support.
+from __future__ import annotations
+import configparser
+import glob
+import io
+import os
+from typing import Any
+from typing import Optional
+
+
+class error(Exception):
+    pass
+
+
+class sentinel:
+    pass
+
+
+class ConfigWrapper:
+    error = configparser.Error
+
+    def __init__(self, printer, fileconfig: configparser.RawConfigParser, access_tracking: dict, section: str):
+        self.printer = printer
+        self.fileconfig = fileconfig
+        self.access_tracking = access_tracking
+        self.section = section
+
+    def get_printer(self):
+        return self.printer
+
+    def get_name(self) -> str:
+        return self.section
+
+    def _get_wrapper(self, parser, option, default, minval=None, maxval=None, above=None, below=None,
+                     note_valid=True):
+        if not self.fileconfig.has_option(self.section, option):
+            if default is not sentinel:
+                if note_valid and default is not None:
+                    self.access_tracking[(self.section.lower(), option.lower())] = default
+                return default
+            raise error("Option '%s' in section '%s' must be specified" % (option, self.section))
+        try:
+            v = parser(self.section, option)
+        except self.error:
+            raise
+        except Exception:
+            raise error("Unable to parse option '%s' in section '%s'" % (option, self.section))
+        if note_valid:
+            self.access_tracking[(self.section.lower(), option.lower())] = v
+        if minval is not None and v < minval:
+            raise error("Option '%s' in section '%s' must have minimum of %s" % (option, self.section, minval))
+        if maxval is not None and v > maxval:
+            raise error("Option '%s' in section '%s' must have maximum of %s" % (option, self.section, maxval))
+        if above is not None and v <= above:
+            raise error("Option '%s' in section '%s' must be above %s" % (option, self.section, above))
+        if below is not None and v >= below:
+            raise error("Option '%s' in section '%s' must be below %s" % (option, self.section, below))
+        return v
+
+    def get(self, option, default=sentinel, note_valid=True) -> Any:
+        return self._get_wrapper(self.fileconfig.get, option, default, note_valid=note_valid)
+
+    def getint(self, option, default=sentinel, minval=None, maxval=None, note_valid=True) -> Any:
+        return self._get_wrapper(self.fileconfig.getint, option, default, minval, maxval, note_valid=note_valid)
+
+    def getfloat(self, option, default=sentinel, minval=None, maxval=None, above=None, below=None,
+                 note_valid=True) -> Any:
+        return self._get_wrapper(self.fileconfig.getfloat, option, default, minval, maxval, above, below,
+                                 note_valid=note_valid)
+
+    def getboolean(self, option, default=sentinel, note_valid=True) -> Any:
+        return self._get_wrapper(self.fileconfig.getboolean, option, default, note_valid=note_valid)
+
+    def getchoice(self, option, choices, default=sentinel, note_valid=True) -> Any:
+        c = self.get(option, default, note_valid=note_valid)
+        if c not in choices:
+            raise error("Choice '%s' for option '%s' in section '%s' is not a valid choice" % (
+                c, option, self.section))
+        return choices[c]
+
+    def getlist(self, option, default=sentinel, sep=',', count=None, parser=str, note_valid=True) -> Any:
+        def lparser(section, option):
+            value = self.fileconfig.get(section, option)
+            values = [parser(p.strip()) for p in value.split(sep) if p.strip()]
+            if count is not None and len(values) != count:
+                raise error("Option '%s' in section '%s' must have %d elements" % (option, section, count))
+            return values
+
+        return self._get_wrapper(lparser, option, default, note_valid=note_valid)
+
+    def getsection(self, section: str) -> ConfigWrapper:
+        return ConfigWrapper(self.printer, self.fileconfig, self.access_tracking, section)
+
+    def has_section(self, section: str) -> bool:
+        return self.fileconfig.has_section(section)
+
+    def get_prefix_sections(self, prefix: str) -> list[ConfigWrapper]:
+        return [self.getsection(s) for s in self.fileconfig.sections() if s.startswith(prefix)]
+
+    def get_prefix_options(self, prefix: str) -> list[str]:
+        return [o for o in self.fileconfig.options(self.section) if o.startswith(prefix)]
+
+
+class PrinterConfig:
+    def __init__(self, printer):
+        self.printer = printer
+
+    def get_printer(self):
+        return self.printer
+
+    def _read_config_file(self, filename: str) -> str:
+        try:
+            with open(filename, 'r') as f:
+                data = f.read()
+        except OSError:
+            raise error("Unable to open config file %s" % (filename,))
+        return data.replace('\r\n', '\n')
+
+    def _parse_config_buffer(self, buffer: list[str], filename: str, fileconfig: configparser.RawConfigParser):
+        if not buffer:
+            return
+        data = '\n'.join(buffer)
+        del buffer[:]
+        fileconfig.read_file(io.StringIO(data), filename)
+
+    def _resolve_include(self, source_filename: str, include_spec: str, fileconfig, visited: set[str]):
+        dirname = os.path.dirname(source_filename)
+        include_spec = include_spec.strip()
+        include_glob = os.path.join(dirname, include_spec)
+        include_filenames = sorted(glob.glob(include_glob))
+        if not include_filenames and not glob.has_magic(include_glob):
+            raise error("Include file '%s' does not exist" % (include_glob,))
+        for include_filename in include_filenames:
+            include_data = self._read_config_file(include_filename)
+            self._parse_config(include_data, include_filename, fileconfig, visited)
+        return include_filenames
+
+    def _parse_config(self, data: str, filename: str, fileconfig, visited: set[str]):
+        path = os.path.abspath(filename)
+        if path in visited:
+            raise error("Recursive include of config file '%s'" % (filename,))
+        visited.add(path)
+        lines = data.split('\n')
+        buffer: list[str] = []
+        for line in lines:
+            pos = line.find('#')
+            if pos >= 0:
+                line = line[:pos]
+            mo = configparser.RawConfigParser.SECTCRE.match(line)
+            header = mo and mo.group('header')
+            if header and header.startswith('include '):
+                self._parse_config_buffer(buffer, filename, fileconfig)
+                self._resolve_include(filename, header[8:], fileconfig, visited)
+            else:
+                buffer.append(line)
+        self._parse_config_buffer(buffer, filename, fileconfig)
+        visited.remove(path)
+
+    def _build_config_wrapper(self, data: str, filename: str) -> ConfigWrapper:
+        fileconfig = configparser.RawConfigParser(strict=False, inline_comment_prefixes=(';', '#'))
+        self._parse_config(data, filename, fileconfig, set())
+        return ConfigWrapper(self.printer, fileconfig, {}, 'printer')
+
+    def read_config(self, filename: str) -> ConfigWrapper:
+        return self._build_config_wrapper(self._read_config_file(filename), filename)
+
+    def read_main_config(self) -> ConfigWrapper:
+        filename = self.printer.get_start_args()['config_file']
+        return self._build_config_wrapper(self._read_config_file(filename), filename)
@@ -0,0 +1 @@
+# Headless stand-in for klippy/extras, gcode_loader is registered here by harness.load_loader()
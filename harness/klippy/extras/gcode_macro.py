@@ -0,0 +1,104 @@
+# Headless stand-in for klippy/extras/gcode_macro.py
+from __future__ import annotations
+import logging
+import traceback
+from typing import Any
+from typing import Optional
+import jinja2
+from gcode import CommandError
+
+
+class GetStatusWrapper:
+    def __init__(self, printer, eventtime: Optional[float] = None):
+        self.printer = printer
+        self.eventtime = eventtime
+        self.cache: dict[str, Any] = {}
+
+    def __getitem__(self, val):
+        sval = str(val).strip()
+        if sval in self.cache:
+            return self.cache[sval]
+        po = self.printer.lookup_object(sval, None)
+        if po is None or not hasattr(po, 'get_status'):
+            raise KeyError(val)
+        if self.eventtime is None:
+            self.eventtime = self.printer.get_reactor().monotonic()
+        self.cache[sval] = res = dict(po.get_status(self.eventtime))
+        return res
+
+    def __contains__(self, val):
+        try:
+            self.__getitem__(val)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        for name, obj in self.printer.lookup_objects():
+            if self.__contains__(name):
+                yield name
+
+
+class TemplateWrapper:
+    def __init__(self, printer, env: jinja2.Environment, name: str, script: str):
+        self.printer = printer
+        self.name = name
+        self.gcode = printer.lookup_object('gcode')
+        gcode_macro = printer.lookup_object('gcode_macro')
+        self.create_template_context = gcode_macro.create_template_context
+        try:
+            self.template = env.from_string(script)
+        except Exception as e:
+            msg = "Error loading template '%s': %s" % (name, traceback.format_exception_only(type(e), e)[-1])
+            logging.exception(msg)
+            raise printer.config_error(msg)
+
+    def render(self, context: Optional[dict] = None) -> str:
+        if context is None:
+            context = self.create_template_context()
+        try:
+            return str(self.template.render(context))
+        except Exception as e:
+            msg = "Error evaluating '%s': %s" % (self.name, traceback.format_exception_only(type(e), e)[-1])
+            logging.exception(msg)
+            raise self.gcode.error(msg)
+
+    def run_gcode_from_command(self, context: Optional[dict] = None):
+        self.gcode.run_script_from_command(self.render(context))
+
+
+class PrinterGCodeMacro:
+    def __init__(self, config):
+        self.printer = config.get_printer()
+        self.env = jinja2.Environment('{%', '%}', '{', '}')
+
+    def load_template(self, config, option: str, default: Optional[str] = None) -> TemplateWrapper:
+        name = "%s:%s" % (config.get_name(), option)
+        if default is None:
+            script = config.get(option)
+        else:
+            script = config.get(option, default)
+        return TemplateWrapper(self.printer, self.env, name, script)
+
+    def _action_emergency_stop(self, msg: str = "action_emergency_stop"):
+        self.printer.invoke_shutdown("Shutdown due to %s" % (msg,))
+        return ""
+
+    def _action_respond_info(self, msg: str):
+        self.printer.lookup_object('gcode').respond_info(msg)
+        return ""
+
+    def _action_raise_error(self, msg: str):
+        raise CommandError(msg)
+
+    def create_template_context(self, eventtime: Optional[float] = None) -> dict[str, Any]:
+        return {
+            'printer': GetStatusWrapper(self.printer, eventtime),
+            'action_emergency_stop': self._action_emergency_stop,
+            'action_respond_info': self._action_respond_info,
+            'action_raise_error': self._action_raise_error,
+        }
+
+
+def load_config(config):
+    return PrinterGCodeMacro(config)
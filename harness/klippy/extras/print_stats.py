@@ -0,0 +1,74 @@
+# Headless stand-in for klippy/extras/print_stats.py
+from __future__ import annotations
+from typing import Any
+from typing import Optional
+
+
+class PrintStats:
+    def __init__(self, config):
+        self.printer = config.get_printer()
+        self.reactor = self.printer.get_reactor()
+        self.reset()
+
+    def reset(self):
+        self.filename = ''
+        self.error_message = ''
+        self.state = 'standby'
+        self.print_start_time: Optional[float] = None
+        self.last_pause_time: Optional[float] = None
+        self.prev_pause_duration = 0.
+        self.total_duration = 0.
+        self.info_total_layer = None
+        self.info_current_layer = None
+
+    def set_current_file(self, filename: str):
+        self.reset()
+        self.filename = filename
+
+    def note_start(self):
+        curtime = self.reactor.monotonic()
+        if self.print_start_time is None:
+            self.print_start_time = curtime
+        elif self.last_pause_time is not None:
+            self.prev_pause_duration += curtime - self.last_pause_time
+            self.last_pause_time = None
+        self.state = 'printing'
+        self.error_message = ''
+
+    def note_pause(self):
+        if self.last_pause_time is None:
+            self.last_pause_time = self.reactor.monotonic()
+        if self.state != 'error':
+            self.state = 'paused'
+
+    def note_complete(self):
+        self._note_finish('complete')
+
+    def note_error(self, message: str):
+        self._note_finish('error', message)
+
+    def note_cancel(self):
+        self._note_finish('cancelled')
+
+    def _note_finish(self, state: str, error_message: str = ''):
+        if self.print_start_time is None:
+            return
+        self.state = state
+        self.error_message = error_message
+        self.total_duration = self.reactor.monotonic() - self.print_start_time
+
+    def get_status(self, eventtime: float) -> dict[str, Any]:
+        total_duration = self.total_duration
+        if self.print_start_time is not None and self.state in ('printing', 'paused'):
+            total_duration = eventtime - self.print_start_time
+        return {
+            'filename': self.filename,
+            'total_duration': total_duration,
+            'state': self.state,
+            'message': self.error_message,
+            'info': {'total_layer': self.info_total_layer, 'current_layer': self.info_current_layer},
+        }
+
+
+def load_config(config):
+    return PrintStats(config)
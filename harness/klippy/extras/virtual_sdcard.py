@@ -0,0 +1,2 @@
+# Headless stand-in for klippy/extras/virtual_sdcard.py, only what gcode_loader imports from it
+VALID_GCODE_EXTS = ['gcode', 'g', 'gco']
@@ -0,0 +1,264 @@
+# Headless stand-in for klippy/gcode.py, follows its parsing and dispatch rules.
+from __future__ import annotations
+import logging
+import re
+import shlex
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+
+class CommandError(Exception):
+    pass
+
+
+class GCodeCommand:
+    error = CommandError
+
+    class sentinel:
+        pass
+
+    def __init__(self, gcode, command: str, commandline: str, params: dict[str, str], need_ack: bool):
+        self._command = command
+        self._commandline = commandline
+        self._params = params
+        self._need_ack = need_ack
+        self.respond_info = gcode.respond_info
+        self.respond_raw = gcode.respond_raw
+
+    def get_command(self) -> str:
+        return self._command
+
+    def get_commandline(self) -> str:
+        return self._commandline
+
+    def get_command_parameters(self) -> dict[str, str]:
+        return self._params
+
+    def get_raw_command_parameters(self) -> str:
+        command = self._command
+        if command.startswith("M117 ") or command.startswith("M118 "):
+            command = command[:4]
+        rawparams = self._commandline
+        urawparams = rawparams.upper()
+        if not urawparams.startswith(command):
+            rawparams = rawparams[urawparams.find(command):]
+            end = rawparams.rfind('*')
+            if end >= 0:
+                rawparams = rawparams[:end]
+        rawparams = rawparams[len(command):]
+        if rawparams.startswith(' '):
+            rawparams = rawparams[1:]
+        return rawparams
+
+    def ack(self, msg: Optional[str] = None) -> bool:
+        if not self._need_ack:
+            return False
+        self.respond_raw("ok %s" % (msg,) if msg else "ok")
+        self._need_ack = False
+        return True
+
+    def get(self, name, default=sentinel, parser=str, minval=None, maxval=None, above=None, below=None):
+        value = self._params.get(name)
+        if value is None:
+            if default is self.sentinel:
+                raise self.error("Error on '%s': missing %s" % (self._commandline, name))
+            return default
+        try:
+            value = parser(value)
+        except Exception:
+            raise self.error("Error on '%s': unable to parse %s" % (self._commandline, value))
+        if minval is not None and value < minval:
+            raise self.error("Error on '%s': %s must have minimum of %s" % (self._commandline, name, minval))
+        if maxval is not None and value > maxval:
+            raise self.error("Error on '%s': %s must have maximum of %s" % (self._commandline, name, maxval))
+        if above is not None and value <= above:
+            raise self.error("Error on '%s': %s must be above %s" % (self._commandline, name, above))
+        if below is not None and value >= below:
+            raise self.error("Error on '%s': %s must be below %s" % (self._commandline, name, below))
+        return value
+
+    def get_int(self, name, default=sentinel, minval=None, maxval=None):
+        return self.get(name, default, parser=int, minval=minval, maxval=maxval)
+
+    def get_float(self, name, default=sentinel, minval=None, maxval=None, above=None, below=None):
+        return self.get(name, default, parser=float, minval=minval, maxval=maxval, above=above, below=below)
+
+
+class GCodeDispatch:
+    error = CommandError
+    Coord = tuple
+    args_r = re.compile('([A-Z_]+|[A-Z*])')
+    extended_r = re.compile(
+        r'^\s*(?:N[0-9]+\s*)?'
+        r'(?P<cmd>[a-zA-Z_][a-zA-Z0-9_]+)(?:\s+|$)'
+        r'(?P<args>[^#*;]*?)'
+        r'\s*(?:[#*;].*)?$'
+    )
+
+    def __init__(self, printer):
+        self.printer = printer
+        self.is_printer_ready = False
+        self.mutex = printer.get_reactor().mutex()
+        self.output_callbacks: list[Callable[[str], None]] = []
+        self.base_gcode_handlers: dict[str, Callable] = {}
+        self.ready_gcode_handlers: dict[str, Callable] = {}
+        self.gcode_handlers = self.base_gcode_handlers
+        self.mux_commands: dict[str, tuple[str, dict[str, Callable]]] = {}
+        self.gcode_help: dict[str, str] = {}
+        printer.register_event_handler("klippy:ready", self._handle_ready)
+        printer.register_event_handler("klippy:shutdown", self._handle_shutdown)
+
+    def is_traditional_gcode(self, cmd: str) -> bool:
+        try:
+            cmd = cmd.upper().split()[0]
+            float(cmd[1:])
+            return cmd[0].isupper() and cmd[1].isdigit()
+        except (ValueError, IndexError):
+            return False
+
+    def register_command(self, cmd: str, func: Optional[Callable], when_not_ready: bool = False,
+                         desc: Optional[str] = None) -> Optional[Callable]:
+        if func is None:
+            old_cmd = self.ready_gcode_handlers.get(cmd)
+            if cmd in self.ready_gcode_handlers:
+                del self.ready_gcode_handlers[cmd]
+            if cmd in self.base_gcode_handlers:
+                del self.base_gcode_handlers[cmd]
+            self.gcode_help.pop(cmd, None)
+            return old_cmd
+        if cmd in self.ready_gcode_handlers:
+            raise self.printer.config_error("gcode command %s already registered" % (cmd,))
+        if not self.is_traditional_gcode(cmd):
+            origfunc = func
+            func = lambda params: origfunc(self._get_extended_params(params))
+        self.ready_gcode_handlers[cmd] = func
+        if when_not_ready:
+            self.base_gcode_handlers[cmd] = func
+        if desc is not None:
+            self.gcode_help[cmd] = desc
+        return None
+
+    def register_mux_command(self, cmd: str, key: str, value: str, func: Callable, desc: Optional[str] = None):
+        prev = self.mux_commands.get(cmd)
+        if prev is None:
+            handler = lambda gcmd: self._cmd_mux(cmd, gcmd)
+            self.register_command(cmd, handler, desc=desc)
+            self.mux_commands[cmd] = prev = (key, {})
+        prev_key, prev_values = prev
+        if prev_key != key:
+            raise self.printer.config_error("mux command %s %s %s may have only one key (%s)" % (
+                cmd, key, value, prev_key))
+        if value in prev_values:
+            raise self.printer.config_error("mux command %s %s %s already registered (%s)" % (
+                cmd, key, value, prev_values))
+        prev_values[value] = func
+
+    def get_command_help(self) -> dict[str, str]:
+        return dict(self.gcode_help)
+
+    def register_output_handler(self, cb: Callable[[str], None]):
+        self.output_callbacks.append(cb)
+
+    def _handle_ready(self):
+        self.is_printer_ready = True
+        self.gcode_handlers = self.ready_gcode_handlers
+
+    def _handle_shutdown(self):
+        self.is_printer_ready = False
+        self.gcode_handlers = self.base_gcode_handlers
+
+    def _process_commands(self, commands: list[str], need_ack: bool = True):
+        for line in commands:
+            line = origline = line.strip()
+            cpos = line.find(';')
+            if cpos >= 0:
+                line = line[:cpos]
+            parts = self.args_r.split(line.upper())
+            numparts = len(parts)
+            cmd = ''
+            if numparts >= 3 and parts[1] != 'N':
+                cmd = parts[1] + parts[2].strip()
+            elif numparts >= 5 and parts[1] == 'N':
+                cmd = parts[3] + parts[4].strip()
+            params = {parts[i]: parts[i + 1].strip() for i in range(1, numparts, 2)}
+            gcmd = GCodeCommand(self, cmd, origline, params, need_ack)
+            handler = self.gcode_handlers.get(cmd, self.cmd_default)
+            try:
+                handler(gcmd)
+            except self.error as e:
+                self._respond_error(str(e))
+                self.printer.send_event("gcode:command_error")
+                if not need_ack:
+                    raise
+            except Exception:
+                msg = 'Internal error on command:"%s"' % (cmd,)
+                logging.exception(msg)
+                self.printer.invoke_shutdown(msg)
+                self._respond_error(msg)
+                if not need_ack:
+                    raise
+            gcmd.ack()
+
+    def run_script_from_command(self, script: str):
+        self._process_commands(script.split('\n'), need_ack=False)
+
+    def run_script(self, script: str):
+        with self.mutex:
+            self._process_commands(script.split('\n'), need_ack=False)
+
+    def get_mutex(self):
+        return self.mutex
+
+    def create_gcode_command(self, command: str, commandline: str, params: dict[str, str]) -> GCodeCommand:
+        return GCodeCommand(self, command, commandline, params, False)
+
+    def respond_raw(self, msg: str):
+        for cb in self.output_callbacks:
+            cb(msg)
+
+    def respond_info(self, msg: str, log: bool = True):
+        if log:
+            logging.info(msg)
+        lines = [line.strip() for line in msg.strip().split('\n')]
+        self.respond_raw("// " + "\n// ".join(lines))
+
+    def _respond_error(self, msg: str):
+        logging.warning(msg)
+        lines = msg.strip().split('\n')
+        if len(lines) > 1:
+            self.respond_info("\n".join(lines), log=False)
+        self.respond_raw('!! %s' % (lines[0].strip(),))
+
+    def _get_extended_params(self, gcmd: GCodeCommand) -> GCodeCommand:
+        m = self.extended_r.match(gcmd.get_commandline())
+        if m is None:
+            raise self.error("Malformed command '%s'" % (gcmd.get_commandline(),))
+        eargs = m.group('args')
+        try:
+            eparams = [earg.split('=', 1) for earg in shlex.split(eargs)]
+            eparams = {k.upper(): v for k, v in eparams}
+            gcmd._params.clear()
+            gcmd._params.update(eparams)
+            return gcmd
+        except ValueError:
+            raise self.error("Malformed command '%s'" % (gcmd.get_commandline(),))
+
+    def _cmd_mux(self, command: str, gcmd: GCodeCommand):
+        key, values = self.mux_commands[command]
+        if None in values:
+            key_param = gcmd.get(key, None)
+        else:
+            key_param = gcmd.get(key)
+        if key_param not in values:
+            raise gcmd.error("The value '%s' is not valid for %s" % (key_param, key))
+        values[key_param](gcmd)
+
+    def cmd_default(self, gcmd: GCodeCommand):
+        cmd = gcmd.get_command()
+        if not cmd:
+            return
+        gcmd.respond_info('Unknown command:"%s"' % (cmd,))
+
+    def get_status(self, eventtime: Optional[float] = None) -> dict[str, Any]:
+        return {'commands': {cmd: {'help': desc} for cmd, desc in self.gcode_help.items()}}
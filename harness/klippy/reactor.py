@@ -0,0 +1,259 @@
+# Headless stand-in for klippy/reactor.py.
+#
+# Greenlets are replaced with threads handing a single baton around, so only one task runs at a time and
+# pause() behaves like in Klipper: other timers and callbacks run until the wake time is reached.
+from __future__ import annotations
+import logging
+import queue
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+NOW = 0.
+NEVER = 9999999999999999.
+
+
+class ReactorTimer:
+    def __init__(self, callback: Callable[[float], float], waketime: float):
+        self.callback = callback
+        self.waketime = waketime
+
+
+class ReactorCompletion:
+    class sentinel:
+        pass
+
+    def __init__(self, reactor: Reactor):
+        self.reactor = reactor
+        self.result = self.sentinel
+        self.waiting: list[ReactorTask] = []
+
+    def test(self) -> bool:
+        return self.result is not self.sentinel
+
+    def complete(self, result: Any):
+        self.result = result
+        for task in self.waiting:
+            self.reactor.wake(task)
+        self.waiting = []
+
+    def wait(self, waketime: float = NEVER, waketime_result: Any = None) -> Any:
+        if self.result is self.sentinel:
+            task = self.reactor.current_task()
+            self.waiting.append(task)
+            self.reactor.pause(waketime)
+            if task in self.waiting:
+                self.waiting.remove(task)
+            if self.result is self.sentinel:
+                return waketime_result
+        return self.result
+
+
+class ReactorMutex:
+    def __init__(self, reactor: Reactor, is_locked: bool = False):
+        self.reactor = reactor
+        self.is_locked = is_locked
+        self.next_pending = False
+        self.queue: list[ReactorTask] = []
+
+    def test(self) -> bool:
+        return self.is_locked
+
+    def lock(self):
+        if not self.is_locked:
+            self.is_locked = True
+            return
+
+        task = self.reactor.current_task()
+        self.queue.append(task)
+        while True:
+            self.reactor.pause(NEVER)
+            if self.next_pending and self.queue[0] is task:
+                self.next_pending = False
+                self.queue.pop(0)
+                return
+
+    def unlock(self):
+        if not self.queue:
+            self.is_locked = False
+            return
+        self.next_pending = True
+        self.reactor.wake(self.queue[0])
+
+    def __enter__(self):
+        self.lock()
+
+    def __exit__(self, *_):
+        self.unlock()
+
+
+class ReactorTask:
+    def __init__(self, reactor: Reactor, func: Callable[[], None], name: str):
+        self.reactor = reactor
+        self.func = func
+        self.resume = threading.Event()
+        self.waketime = NEVER
+        self.done = False
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.reactor_task = self
+
+    def _run(self):
+        self.resume.wait()
+        self.resume.clear()
+        try:
+            self.func()
+        except BaseException as e:
+            logging.exception('Unhandled exception in reactor task')
+            self.reactor.errors.append(e)
+        finally:
+            self.done = True
+            self.reactor.yield_baton()
+
+
+class Reactor:
+    NOW = NOW
+    NEVER = NEVER
+
+    def __init__(self):
+        self._timers: list[ReactorTimer] = []
+        self._sleeping: list[ReactorTask] = []
+        self._async: queue.SimpleQueue = queue.SimpleQueue()
+        self._async_event = threading.Event()
+        self._baton = threading.Event()
+        self.errors: list[BaseException] = []
+        self.switches = 0
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    # timers
+    def register_timer(self, callback: Callable[[float], float], waketime: float = NEVER) -> ReactorTimer:
+        timer = ReactorTimer(callback, waketime)
+        self._timers.append(timer)
+        return timer
+
+    def unregister_timer(self, timer: ReactorTimer):
+        timer.waketime = NEVER
+        if timer in self._timers:
+            self._timers.remove(timer)
+
+    def update_timer(self, timer: ReactorTimer, waketime: float):
+        timer.waketime = waketime
+
+    # callbacks
+    def register_callback(self, callback: Callable[[float], Any], waketime: float = NOW) -> ReactorCompletion:
+        completion = self.completion()
+
+        def run(eventtime):
+            self.unregister_timer(timer)
+            completion.complete(callback(eventtime))
+            return NEVER
+
+        timer = self.register_timer(run, waketime)
+        return completion
+
+    def register_async_callback(self, callback: Callable[[float], Any], waketime: float = NOW):
+        self._async.put((callback, waketime))
+        self._async_event.set()
+
+    def async_complete(self, completion: ReactorCompletion, result: Any):
+        self.register_async_callback(lambda _: completion.complete(result))
+
+    def completion(self) -> ReactorCompletion:
+        return ReactorCompletion(self)
+
+    def mutex(self, is_locked: bool = False) -> ReactorMutex:
+        return ReactorMutex(self, is_locked)
+
+    # tasks
+    def current_task(self) -> Optional[ReactorTask]:
+        return getattr(threading.current_thread(), 'reactor_task', None)
+
+    def wake(self, task: ReactorTask):
+        task.waketime = NOW
+
+    def yield_baton(self):
+        self._baton.set()
+
+    def pause(self, waketime: float) -> float:
+        task = self.current_task()
+        if task is None:
+            # called by the driving thread, run everything else in the meantime
+            self.run_until(lambda: self.monotonic() >= waketime)
+            return self.monotonic()
+
+        task.waketime = waketime
+        self._sleeping.append(task)
+        self.yield_baton()
+        task.resume.wait()
+        task.resume.clear()
+        return self.monotonic()
+
+    def _switch(self, task: ReactorTask):
+        self.switches += 1
+        self._baton.clear()
+        task.resume.set()
+        self._baton.wait()
+
+    def _fire(self, timer: ReactorTimer, eventtime: float):
+        timer.waketime = NEVER
+
+        def run():
+            waketime = timer.callback(eventtime)
+            if timer in self._timers:
+                timer.waketime = waketime
+
+        task = ReactorTask(self, run, 'reactor timer')
+        task.thread.start()
+        self._switch(task)
+
+    # runs every task and timer that is due once, returns False when nothing was due
+    def step(self) -> bool:
+        while True:
+            try:
+                callback, waketime = self._async.get_nowait()
+            except queue.Empty:
+                break
+            self.register_callback(callback, waketime)
+        self._async_event.clear()
+
+        now = self.monotonic()
+        due = [(task.waketime, 0, task) for task in self._sleeping if task.waketime <= now]
+        due += [(timer.waketime, 1, timer) for timer in self._timers if timer.waketime <= now]
+        due.sort(key=lambda item: (item[0], item[1]))
+        for _, kind, item in due:
+            if kind == 0:
+                if item in self._sleeping and item.waketime <= now:
+                    self._sleeping.remove(item)
+                    self._switch(item)
+            elif item in self._timers and item.waketime <= now:
+                self._fire(item, now)
+        return len(due) > 0
+
+    def _next_waketime(self) -> float:
+        waketime = NEVER
+        for task in self._sleeping:
+            waketime = min(waketime, task.waketime)
+        for timer in self._timers:
+            waketime = min(waketime, timer.waketime)
+        return waketime
+
+    def run_until(self, predicate: Callable[[], bool], timeout: Optional[float] = None):
+        deadline = None if timeout is None else self.monotonic() + timeout
+        while not predicate():
+            if self.errors:
+                raise self.errors.pop(0)
+            if self.step():
+                continue
+
+            now = self.monotonic()
+            if deadline is not None and now >= deadline:
+                raise TimeoutError('reactor did not reach expected state in time')
+            delay = min(self._next_waketime(), NEVER if deadline is None else deadline) - now
+            self._async_event.wait(max(0., min(delay, 0.050)))
+
+    def run_for(self, seconds: float):
+        end = self.monotonic() + seconds
+        self.run_until(lambda: self.monotonic() >= end)
@@ -0,0 +1,72 @@
+# Headless stand-in for klippy/webhooks.py, endpoints are called directly instead of over a socket
+from __future__ import annotations
+from typing import Any
+from typing import Callable
+
+
+class WebRequestError(Exception):
+    pass
+
+
+class sentinel:
+    pass
+
+
+class WebRequest:
+    error = WebRequestError
+
+    def __init__(self, method: str, params: dict[str, Any]):
+        self.method = method
+        self.params = params
+        self.response = None
+
+    def get(self, item: str, default: Any = sentinel, types: tuple = None) -> Any:
+        value = self.params.get(item, default)
+        if value is sentinel:
+            raise WebRequestError("Missing Argument [%s]" % (item,))
+        if types is not None and type(value) not in types and item in self.params:
+            raise WebRequestError("Invalid Argument Type [%s]" % (item,))
+        return value
+
+    def get_str(self, item: str, default: Any = sentinel) -> Any:
+        return self.get(item, default, types=(str,))
+
+    def get_int(self, item: str, default: Any = sentinel) -> Any:
+        return self.get(item, default, types=(int,))
+
+    def get_float(self, item: str, default: Any = sentinel) -> Any:
+        return float(self.get(item, default, types=(int, float)))
+
+    def get_dict(self, item: str, default: Any = sentinel) -> Any:
+        return self.get(item, default, types=(dict,))
+
+    def get_boolean(self, item: str, default: Any = sentinel) -> Any:
+        return self.get(item, default, types=(bool,))
+
+    def get_method(self) -> str:
+        return self.method
+
+    def send(self, data: Any):
+        if self.response is not None:
+            raise WebRequestError("Multiple calls to send not allowed")
+        self.response = data
+
+
+class WebHooks:
+    def __init__(self, printer):
+        self.printer = printer
+        self._endpoints: dict[str, Callable[[WebRequest], None]] = {}
+        self.remote_calls: list[tuple[str, dict[str, Any]]] = []
+
+    def register_endpoint(self, path: str, callback: Callable[[WebRequest], None]):
+        if path in self._endpoints:
+            raise WebRequestError("Path already registered to an endpoint")
+        self._endpoints[path] = callback
+
+    def call_remote_method(self, method: str, **kwargs):
+        self.remote_calls.append((method, kwargs))
+
+    def call(self, path: str, **params) -> Any:
+        request = WebRequest(path, params)
+        self._endpoints[path](request)
+        return request.response
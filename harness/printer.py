@@ -0,0 +1,224 @@
+# Headless printer driving gcode_loader through the stand-in klippy modules in harness/klippy.
+#
+#   printer = HeadlessPrinter('printer.cfg')
+#   printer.load()
+#   printer.run_script('SDCARD_PRINT_FILE FILENAME=test.gcode')
+#   printer.wait_print()
+from __future__ import annotations
+from collections import Counter
+import importlib
+import importlib.util
+import os
+import sys
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KLIPPY_PATH = os.path.join(ROOT, 'harness', 'klippy')
+SRC_PATH = os.path.join(ROOT, 'src')
+
+# commands accepted and counted without doing anything, like a printer with no motion hardware
+NULL_COMMANDS = [
+    'G0', 'G1', 'G2', 'G3', 'G4', 'G10', 'G11', 'G20', 'G21', 'G28', 'G90', 'G91', 'G92',
+    'M82', 'M83', 'M84', 'M104', 'M105', 'M106', 'M107', 'M109', 'M114', 'M140', 'M190', 'M204', 'M220', 'M221',
+    'M400', 'M73', 'M117', 'M118', 'SET_VELOCITY_LIMIT', 'SET_PRESSURE_ADVANCE', 'SET_PRINT_STATS_INFO',
+    'EXCLUDE_OBJECT_DEFINE', 'EXCLUDE_OBJECT_START', 'EXCLUDE_OBJECT_END', 'TURN_OFF_HEATERS',
+]
+
+
+# imports src as extras.gcode_loader, from a real klippy directory or from the stand-in modules
+def load_loader(klippy: Optional[str] = None):
+    path = os.path.abspath(os.path.expanduser(klippy or KLIPPY_PATH))
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    if 'extras.gcode_loader' in sys.modules:
+        return sys.modules['extras.gcode_loader']
+
+    extras = importlib.import_module('extras')
+    spec = importlib.util.spec_from_file_location('extras.gcode_loader', os.path.join(SRC_PATH, '__init__.py'),
+                                                  submodule_search_locations=[SRC_PATH])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    extras.gcode_loader = module
+    return module
+
+
+MOVE_COMMANDS = {'G0', 'G1', 'G2', 'G3'}
+
+
+# toolhead with print time planned against the reactor clock, every move takes move_time
+class NullToolhead:
+    def __init__(self, reactor, move_time: float = 0.):
+        self.reactor = reactor
+        self.move_time = move_time
+        self.print_time = 0.
+
+    def move(self):
+        self.print_time = max(self.print_time, self.reactor.monotonic()) + self.move_time
+
+    def check_busy(self, eventtime: float) -> tuple[float, float, bool]:
+        return self.print_time, eventtime, True
+
+    def get_status(self, eventtime: float) -> dict[str, Any]:
+        return {'print_time': self.print_time, 'estimated_print_time': eventtime}
+
+
+class NullMotion:
+    def __init__(self, printer: HeadlessPrinter, commands: Optional[list[str]] = None,
+                 toolhead: Optional[NullToolhead] = None):
+        self.counts: Counter[str] = Counter()
+        self.toolhead = toolhead
+        gcode = printer.lookup_object('gcode')
+        for cmd in commands or NULL_COMMANDS:
+            gcode.register_command(cmd, self._handler(cmd))
+
+    def _handler(self, cmd: str) -> Callable:
+        toolhead = self.toolhead if cmd in MOVE_COMMANDS else None
+
+        def handler(_):
+            self.counts[cmd] += 1
+            if toolhead is not None:
+                toolhead.move()
+
+        return handler
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+
+class HeadlessPrinter:
+    # move_time is the print time every move adds to the toolhead buffer, for pacing
+    def __init__(self, config_file: str, motion: bool = True, move_time: float = 0.):
+        load_loader()
+        import configfile
+        import gcode
+        import reactor
+        import webhooks
+
+        self.config_error = configfile.error
+        self.command_error = gcode.CommandError
+        self.reactor = reactor.Reactor()
+        self.start_args = {'config_file': os.path.abspath(config_file)}
+        self.objects: dict[str, Any] = {}
+        self.event_handlers: dict[str, list[Callable]] = {}
+        self.shutdown_message: Optional[str] = None
+        self.output: list[str] = []
+
+        self.objects['webhooks'] = webhooks.WebHooks(self)
+        self.objects['gcode'] = gcode.GCodeDispatch(self)
+        self.objects['configfile'] = configfile.PrinterConfig(self)
+        self.gcode.register_output_handler(self.output.append)
+        self.motion = None
+        if motion:
+            self.objects['toolhead'] = NullToolhead(self.reactor, move_time)
+            self.motion = NullMotion(self, toolhead=self.objects['toolhead'])
+
+    @property
+    def gcode(self):
+        return self.objects['gcode']
+
+    @property
+    def loader(self):
+        return self.objects['virtual_sdcard']
+
+    # klippy Printer interface
+    def get_reactor(self):
+        return self.reactor
+
+    def get_start_args(self) -> dict[str, Any]:
+        return self.start_args
+
+    def lookup_object(self, name: str, default: Any = ...):
+        if name in self.objects:
+            return self.objects[name]
+        if default is ...:
+            raise self.config_error("Unknown config object '%s'" % (name,))
+        return default
+
+    def lookup_objects(self, module: Optional[str] = None) -> list[tuple[str, Any]]:
+        if module is None:
+            return list(self.objects.items())
+        prefix = module + ' '
+        return [(n, o) for n, o in self.objects.items() if n == module or n.startswith(prefix)]
+
+    def load_object(self, config, section: str, default: Any = ...):
+        if section in self.objects:
+            return self.objects[section]
+        module_parts = section.split()
+        init_func = 'load_config' if len(module_parts) == 1 else 'load_config_prefix'
+        try:
+            module = importlib.import_module('extras.' + module_parts[0])
+        except ImportError:
+            if default is ...:
+                raise self.config_error("Unable to load module '%s'" % (section,))
+            return default
+        init = getattr(module, init_func, None)
+        if init is None:
+            if default is ...:
+                raise self.config_error("Unable to load module '%s'" % (section,))
+            return default
+        self.objects[section] = init(config.getsection(section))
+        return self.objects[section]
+
+    def register_event_handler(self, event: str, callback: Callable):
+        self.event_handlers.setdefault(event, []).append(callback)
+
+    def send_event(self, event: str, *params) -> list[Any]:
+        return [cb(*params) for cb in self.event_handlers.get(event, [])]
+
+    def is_shutdown(self) -> bool:
+        return self.shutdown_message is not None
+
+    def invoke_shutdown(self, msg: str):
+        if self.shutdown_message is not None:
+            return
+        self.shutdown_message = msg
+        self.send_event("klippy:shutdown")
+
+    # driving
+    def load(self):
+        config = self.objects['configfile'].read_main_config()
+        for section_config in config.get_prefix_sections(''):
+            self.load_object(config, section_config.get_name(), None)
+        self.send_event("klippy:connect")
+        self.send_event("klippy:ready")
+
+    # runs callable as a reactor task and waits for its result
+    def call(self, func: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        completion = self.reactor.completion()
+
+        def run(_):
+            try:
+                completion.complete((func(), None))
+            except Exception as e:
+                completion.complete((None, e))
+
+        self.reactor.register_callback(run)
+        self.reactor.run_until(completion.test, timeout)
+        result, error = completion.result
+        if error is not None:
+            raise error
+        return result
+
+    def run_script(self, script: str, timeout: Optional[float] = None) -> list[str]:
+        start = len(self.output)
+        self.call(lambda: self.gcode.run_script(script), timeout)
+        return self.output[start:]
+
+    def call_webhook(self, path: str, timeout: Optional[float] = None, **params) -> Any:
+        return self.call(lambda: self.objects['webhooks'].call(path, **params), timeout)
+
+    def run_until(self, predicate: Callable[[], bool], timeout: Optional[float] = None):
+        self.reactor.run_until(predicate, timeout)
+
+    def run_for(self, seconds: float):
+        self.reactor.run_for(seconds)
+
+    def wait_print(self, timeout: Optional[float] = None):
+        self.run_until(lambda: not self.loader.is_active(), timeout)
+
+    def get_status(self, name: str) -> dict[str, Any]:
+        return self.lookup_object(name).get_status(self.reactor.monotonic())
@@ -7,19 +7,29 @@ from __future__ import annotations
 import re
 from typing import TYPE_CHECKING
 from typing import Optional
+from typing import Union
 import logging
 import os
+import threading
 from gcode import CommandError
-from .mock.printer_config import PrinterConfig
+from .mock.printer_config import ConfigFiles
 from .interfaces.loader import VirtualSDCardInterface
 from .iterator import full_file_iterator
 from .iterator import full_virtual_file_iterator
 from .iterator import WithVirtualFileIterator
 from .locator import GCodeLocator
+from .pacing import PACING_MODES
+from .pacing import Pacer
 from .macro import Macro
 from .macro import PrinterMacro
 from .macro import VariableMode
+from .macro.reload import prepare_reload
+from .macro.template import MacroTemplate
+from .macro.template import validate_templates
 from .dispatch import GCodeDispatchHelper
+from .index import GCodeFileIndex
+from .index import LayerMap
+from .stats import CommandStats
 
 if TYPE_CHECKING:
     from gcode import GCodeCommand
@@ -32,6 +42,7 @@ if TYPE_CHECKING:
     from webhooks import WebRequest
     from .file import GCodeFile
     from .iterator import GCodeFileIterator
+    from .macro.reload import PreparedReload
 
 
 class GCodeLoader(VirtualSDCardInterface):
@@ -43,14 +54,49 @@ class GCodeLoader(VirtualSDCardInterface):
     gcode: GCodeDispatch
     on_error_gcode: TemplateWrapper
     uninterrupted: set[str]
+    batch_lines: int
+    batch_time: float
+    prefetch_lines: int
+    config_files: Optional[ConfigFiles]
+    config_vars_merged: bool
+    reload_pending: bool
+    file_index_enabled: bool
+    file_index: Optional[GCodeFileIndex]
+    skip_excluded_objects: bool
+    cache_path: Optional[str]
+    compiled_cache: bool
+    pacer: Pacer
 
     def __init__(self, helper: GCodeDispatchHelper, config: ConfigWrapper):
         self.helper = helper
         self.uninterrupted = set(map(lambda m: m.upper(), config.getlist('uninterrupted', default=[])))
+        self.batch_lines = config.getint('batch_lines', 1, minval=1)
+        self.batch_time = config.getfloat('batch_time', 0.050, above=0.)
+        self.prefetch_lines = config.getint('prefetch_lines', 0, minval=0)
+        self.file_index_enabled = config.getboolean('file_index', False)
+        self.file_index = None
+        self.skip_excluded_objects = config.getboolean('skip_excluded_objects', False)
+        self.cache_path = config.get('cache_path', None)
+        if self.cache_path is not None:
+            self.cache_path = os.path.normpath(os.path.expanduser(self.cache_path))
+            os.makedirs(self.cache_path, exist_ok=True)
+        self.compiled_cache = config.getboolean('compiled_cache', False)
+        min_buffer = config.getfloat('pacing_min_buffer', 1.0, above=0.)
+        self.pacer = Pacer(self.helper.printer,
+                           mode=config.getchoice('pacing', PACING_MODES, 'fixed'),
+                           min_buffer=min_buffer,
+                           max_buffer=config.getfloat('pacing_max_buffer', 1.8, above=min_buffer))
         self.current_file = None
+        self._excluded = frozenset()
+        self.config_files = None
+        self.config_vars_merged = False  # set when the reload which read config_files merged their variables
+        self.reload_pending = False
+        self.validate_pending = False
 
         # Klipper setup
         self.helper.printer.register_event_handler("klippy:shutdown", self._handle_shutdown)
+        if config.getboolean('validate_macros', False):
+            self.helper.printer.register_event_handler("klippy:ready", self._handle_ready)
 
         # Print Stat Tracking
         self.print_stats = self.helper.printer.load_object(config, 'print_stats')
@@ -60,6 +106,10 @@ class GCodeLoader(VirtualSDCardInterface):
         self.must_pause_work = False
         self.cmd_from_sd = False
         self.work_timer = None
+        self.work_done = None  # completed by the work handler on exit
+        self._work_wake = None  # completed to cut a backoff of the work handler short
+        self._stop_request: Optional[tuple[str, float]] = None
+        self.stop_latency = {'pause': CommandStats(), 'cancel': CommandStats()}
 
         # Error handling
         gcode_macro = self.helper.printer.load_object(config, 'gcode_macro')
@@ -80,19 +130,31 @@ class GCodeLoader(VirtualSDCardInterface):
                                     desc=self.cmd_SDCARD_PRINT_FILE_help)
         self.gcode.register_command('MACRO_RELOAD', self.cmd_MACRO_RELOAD,
                                     desc="Reloads macros from config files")
+        self.gcode.register_command('MACRO_VALIDATE', self.cmd_MACRO_VALIDATE, desc=self.cmd_MACRO_VALIDATE_help)
         self.gcode.register_command('PRINT_FROM_MACRO', self.cmd_PRINT_FROM_MACRO,
                                     desc="Runs macro as a print")
+        self.gcode.register_command('SDCARD_SEEK', self.cmd_SDCARD_SEEK, desc=self.cmd_SDCARD_SEEK_help)
+        self.gcode.register_command('SKIP_TO_LAYER', self.cmd_SKIP_TO_LAYER, desc=self.cmd_SKIP_TO_LAYER_help)
+        self.gcode.register_command('MACRO_PROFILE', self.cmd_MACRO_PROFILE, desc=self.cmd_MACRO_PROFILE_help)
+        self.gcode.register_command('LOADER_TELEMETRY', self.cmd_LOADER_TELEMETRY, desc=self.cmd_LOADER_TELEMETRY_help)
+
+        webhooks = self.helper.printer.lookup_object('webhooks')
+        webhooks.register_endpoint("gcode_loader/seek", self.handle_webhook_seek)
+        webhooks.register_endpoint("gcode_loader/layers", self.handle_webhook_layers)
+        webhooks.register_endpoint("gcode_loader/telemetry", self.handle_webhook_telemetry)
 
     def stats(self, _):
         if self.work_timer is None:
             return False, ""
+        telemetry = self.helper.telemetry
+        suffix = ' ' + telemetry.stats() if telemetry.enabled else ''
         if self.current_file is None:
-            return True, "sd_pos=0"
-        return True, "sd_pos=%d" % (self.current_file.pos,)
+            return True, "sd_pos=0" + suffix
+        return True, "sd_pos=%d" % (self.current_file.pos,) + suffix
 
     def get_file_list(self, check_subdirs: bool = False):
         try:
-            return [(f.name, f.size) for f in self.helper.locator.get_file_list(check_subdirs)]
+            return [(f.name, f.listed_size) for f in self.helper.locator.get_file_list(check_subdirs)]
         except:
             logging.exception("gcode_loader get_file_list")
             raise CommandError("Unable to get file list")
@@ -118,12 +180,17 @@ class GCodeLoader(VirtualSDCardInterface):
         self._load_file(filename, check_subdirs=True)
         self.do_resume()
 
+    LIST_CHUNK_SIZE = 100
+
     def cmd_M20(self, gcmd: GCodeCommand):
         # List SD card
         files = self.get_file_list()
         gcmd.respond_raw("Begin file list")
-        for name, size in files:
+        for i, (name, size) in enumerate(files):
             gcmd.respond_raw("%s %d" % (name, size))
+            # stream huge listings without starving the reactor
+            if i % self.LIST_CHUNK_SIZE == self.LIST_CHUNK_SIZE - 1:
+                self.reactor.pause(self.reactor.NOW)
         gcmd.respond_raw("End file list")
 
     def cmd_M21(self, gcmd: GCodeCommand):
@@ -164,34 +231,227 @@ class GCodeLoader(VirtualSDCardInterface):
             return
         gcmd.respond_raw("SD printing byte %d/%d" % (self.current_file.pos, self.current_file.size))
 
+    cmd_SDCARD_SEEK_help = "Moves loaded SD file to the start of given line or of the line containing given position"
+
+    def cmd_SDCARD_SEEK(self, gcmd: GCodeCommand):
+        pos = self._seek(gcmd.get_int('LINE', None, minval=1), gcmd.get_int('POSITION', None, minval=0))
+        gcmd.respond_info(f"SD file position {pos}")
+
+    def _seek(self, line: Optional[int], position: Optional[int]) -> int:
+        if self.work_timer is not None:
+            raise CommandError("Printer busy")
+
+        if self.current_file is None:
+            raise CommandError("no file loaded")
+
+        if (line is None) == (position is None):
+            raise CommandError("Exactly one of LINE or POSITION is required")
+
+        if self.file_index is None or not self.file_index.lines.ready:
+            raise CommandError("Line index not available")
+
+        try:
+            if line is not None:
+                pos = self.file_index.lines.line_offset(line)
+            else:
+                pos = self.file_index.lines.snap(min(position, self.current_file.size))
+        except IndexError as e:
+            raise CommandError(str(e))
+
+        self.current_file.seek(pos)
+        return pos
+
+    cmd_SKIP_TO_LAYER_help = "Moves loaded SD file to the start of given layer"
+
+    def cmd_SKIP_TO_LAYER(self, gcmd: GCodeCommand):
+        layer = gcmd.get_int('LAYER', minval=0)
+        if self.work_timer is not None:
+            raise CommandError("Printer busy")
+
+        if self.current_file is None:
+            raise CommandError("no file loaded")
+
+        layers = self._layer_map()
+        if layers is None:
+            raise CommandError("Layer map not available")
+
+        try:
+            pos = layers.layer_offset(layer)
+        except IndexError as e:
+            raise CommandError(str(e))
+
+        self.current_file.seek(pos)
+        gcmd.respond_info(f"SD file position {pos} (layer {layer})")
+
+    cmd_LOADER_TELEMETRY_help = "Enables, disables, resets or reports dispatch telemetry"
+
+    def cmd_LOADER_TELEMETRY(self, gcmd: GCodeCommand):
+        telemetry = self.helper.telemetry
+        enable = gcmd.get_int('ENABLE', None, minval=0, maxval=1)
+        if enable is not None:
+            telemetry.set_enabled(bool(enable))
+        if gcmd.get_int('RESET', 0, minval=0, maxval=1):
+            telemetry.reset()
+
+        status = telemetry.get_status()
+        msg = [f"Telemetry {'enabled' if telemetry.enabled else 'disabled'}: {telemetry.stats()}"]
+        commands = sorted(status['commands'].items(), key=lambda item: item[1]['total'], reverse=True)
+        for cmd, stats in commands[:gcmd.get_int('TOP', 10, minval=0)]:
+            msg.append(f"{cmd}: count={stats['count']} total={stats['total']:.3f} avg={stats['avg'] * 1000:.3f}ms "
+                       f"max={stats['max'] * 1000:.3f}ms")
+        gcmd.respond_info('\n'.join(msg))
+
+    cmd_MACRO_PROFILE_help = "Profiles macro rendering and execution: ACTION=START|STOP|DUMP|RESET"
+
+    def cmd_MACRO_PROFILE(self, gcmd: GCodeCommand):
+        profiler = self.helper.profiler
+        action = gcmd.get('ACTION', 'DUMP').upper()
+        if action == 'START':
+            profiler.start()
+            gcmd.respond_info("Macro profiling started")
+        elif action == 'STOP':
+            profiler.stop()
+            gcmd.respond_info("Macro profiling stopped")
+        elif action == 'RESET':
+            profiler.reset()
+            gcmd.respond_info("Macro profile cleared")
+        elif action == 'DUMP':
+            report = profiler.report()
+            if not report:
+                gcmd.respond_info("No macro profile recorded")
+            else:
+                gcmd.respond_info("Macro profile (self/inclusive):\n" + "\n".join(report))
+        else:
+            raise CommandError(f"Unknown MACRO_PROFILE action '{action}'")
+
     def cmd_MACRO_RELOAD(self, gcmd: GCodeCommand):
         name_filter = gcmd.get('NAME', None)
         if name_filter:
             name_filter = name_filter.upper()
-        vars_mode = gcmd.get_int('VARIABLES', 1)
+        vars_mode = VariableMode(gcmd.get_int('VARIABLES', 1, minval=0, maxval=2))
+        force = gcmd.get_int('FORCE', 0)
+
+        # replacing variables resets runtime state, so it can't be skipped on unchanged files,
+        # adding them only when the reload which read the files merged them already
+        skippable = vars_mode == VariableMode.SKIP or (vars_mode == VariableMode.MERGE and self.config_vars_merged)
+        if not force and skippable and self.config_files is not None and not self.config_files.changed():
+            self.helper.respond_info("No config changes detected, use FORCE=1 to reload anyway")
+            return
 
-        config = PrinterConfig(self.helper.printer).read_main_config()
-        config = {s.get_name().split()[1].upper(): s for s in config.get_prefix_sections('gcode_macro ')}
+        if self.reload_pending:
+            raise CommandError("Macro reload already in progress")
 
-        for name, macro_config in config.items():
-            name = macro_config.get_name().split()[1].upper()
-            if name_filter is not None and name != name_filter:
-                continue
+        # config parsing and template compilation run in a thread so the reactor keeps feeding motion
+        completion = self.reactor.completion()
+        self.reload_pending = True
 
-            if self.helper.has_macro(name):
-                self.helper.get_macro(name).update_config(macro_config, VariableMode(vars_mode), verbose=True)
-            else:
-                self.helper.load_macro(macro_config, verbose=True)
+        def prepare():
+            try:
+                result = prepare_reload(self.helper, name_filter)
+            except Exception as e:
+                logging.exception("gcode_loader macro reload")
+                result = e
+            self.reactor.register_async_callback(lambda _: completion.complete(result))
 
-        for name in self.helper.get_macros():
-            if name_filter is not None and name != name_filter:
-                continue
+        threading.Thread(target=prepare, name='gcode_loader reload', daemon=True).start()
 
-            if name not in config:
-                self.helper.remove_macro(name, verbose=True)
+        if not self.is_active():
+            self._finish_macro_reload(completion.wait(), name_filter, vars_mode)
+            return
 
+        # while printing the gcode mutex can't be held for the whole parse, apply later in a single step
+        def apply(_):
+            prepared = completion.wait()
+            with self.gcode.get_mutex():
+                try:
+                    self._finish_macro_reload(prepared, name_filter, vars_mode)
+                except CommandError as e:
+                    self.helper.respond_error_message(str(e))
+                except Exception:
+                    logging.exception("gcode_loader macro reload")
+                    self.helper.respond_error_message("Internal error on macro reload")
+
+        self.reactor.register_callback(apply)
+        self.helper.respond_info("Reload started")
+
+    def _finish_macro_reload(
+        self, prepared: Union[PreparedReload, Exception], name_filter: Optional[str], vars_mode: VariableMode
+    ):
+        self.reload_pending = False
+        if isinstance(prepared, Exception):
+            raise CommandError(f"Macro reload failed: {prepared}")
+
+        if name_filter is None:
+            self.config_files = prepared.files
+            self.config_vars_merged = vars_mode != VariableMode.SKIP
+        self.helper.apply_macro_reload(prepared, vars_mode, name_filter)
         self.helper.respond_info("Reload complete")
 
+    cmd_MACRO_VALIDATE_help = "Compiles macro templates and reports syntax errors: [NAME=<macro>]"
+
+    def cmd_MACRO_VALIDATE(self, gcmd: GCodeCommand):
+        name = gcmd.get('NAME', None)
+        if name is not None and not self.helper.has_macro(name):
+            raise CommandError(f"Unknown macro '{name}'")
+        templates = self._macro_templates(name)
+        completion = self._validate(templates)
+
+        if not self.is_active():
+            self._finish_macro_validate(completion.wait(), len(templates))
+            return
+
+        # waiting here would hold the gcode mutex and stall the print, report once compiled
+        def report(_):
+            try:
+                self._finish_macro_validate(completion.wait(), len(templates))
+            except CommandError as e:
+                self.helper.respond_error_message(str(e))
+
+        self.reactor.register_callback(report)
+        self.helper.respond_info("Validation started")
+
+    def _finish_macro_validate(self, errors: list[tuple[str, str]], count: int):
+        for macro, error in errors:
+            self.helper.respond_info(f"{macro}: {error}")
+        if errors:
+            raise CommandError(f"{len(errors)} of {count} macros failed to compile")
+        self.helper.respond_info(f"{count} macros valid")
+
+    def _macro_templates(self, name: Optional[str] = None) -> list[MacroTemplate]:
+        names = [name] if name is not None else list(self.helper.get_macros())
+        return [self.helper.get_macro(macro).template for macro in names]
+
+    # compiles in a thread, completes with (name, error) of failing templates
+    def _validate(self, templates: list[MacroTemplate]):
+        completion = self.reactor.completion()
+
+        def validate():
+            try:
+                result = validate_templates(templates)
+            except Exception as e:
+                logging.exception("gcode_loader macro validation")
+                result = [('*', str(e))]
+            self.reactor.register_async_callback(lambda _: completion.complete(result))
+
+        threading.Thread(target=validate, name='gcode_loader validate', daemon=True).start()
+        return completion
+
+    # background pass over lazily loaded macros, errors are reported before the macro is first used
+    def _handle_ready(self):
+        if self.validate_pending:
+            return
+        self.validate_pending = True
+        completion = self._validate(self._macro_templates())
+
+        def report(_):
+            errors = completion.wait()
+            self.validate_pending = False
+            for macro, error in errors:
+                logging.warning("gcode_loader macro %s: %s", macro, error)
+                self.helper.respond_error_message(f"Macro {macro} failed to compile: {error}")
+
+        self.reactor.register_callback(report)
+
     strip_macro_param = re.compile(r'^\s*MACRO\s*=\s*', re.IGNORECASE)
 
     def cmd_PRINT_FROM_MACRO(self, gcmd: GCodeCommand):
@@ -213,6 +473,7 @@ class GCodeLoader(VirtualSDCardInterface):
         return self.cmd_from_sd
 
     def get_status(self, _):
+        layers = self._layer_map()
         return {
             'file_path': self.file_path(),
             'progress': self.progress(),
@@ -220,37 +481,75 @@ class GCodeLoader(VirtualSDCardInterface):
             'is_virtual': isinstance(self.current_file, WithVirtualFileIterator),
             'file_position': self.current_file.pos if self.current_file else 0,
             'file_size': self.current_file.size if self.current_file else 0,
+            'file_line': self._file_line(),
+            'file_lines': self.file_index.lines.lines if self._file_index_ready() else None,
+            'current_layer': layers.layer_at(self.current_file.pos) if layers else None,
+            'layer_count': len(layers.layers) if layers else None,
+            'render_cache': self.helper.get_render_cache_status(),
+            'include_cache': self.helper.include_cache.get_status(),
+            'telemetry': self.helper.telemetry.get_status(),
+            'pacing': self.pacer.get_status(),
+            'stop_latency': {kind: stats.get_status() for kind, stats in self.stop_latency.items()},
         }
 
+    def _file_index_ready(self) -> bool:
+        return self.current_file is not None and self.file_index is not None and self.file_index.lines.ready
+
+    def _layer_map(self) -> Optional[LayerMap]:
+        if self.current_file is None or self.file_index is None or not self.file_index.layers.ready:
+            return None
+        return self.file_index.layers
+
+    def _file_line(self) -> Optional[int]:
+        if not self._file_index_ready():
+            return None
+        return self.file_index.lines.lines_before(self.current_file.pos)
+
     def file_path(self):
         if self.current_file:
             return self.current_file.name
         return None
 
     def progress(self):
-        if self.current_file and self.current_file.size > 0:
-            return float(self.current_file.pos) / self.current_file.size
-        else:
+        if not self.current_file or self.current_file.size <= 0:
             return 0.
 
+        # with known layers progress covers the printed part only, without headers and thumbnails
+        layers = self._layer_map()
+        if layers is not None and layers.start is not None and layers.start < self.current_file.size:
+            pos = max(0, self.current_file.pos - layers.start)
+            return min(1., float(pos) / (self.current_file.size - layers.start))
+
+        # compressed sizes are estimated until the file was read through
+        return min(1., float(self.current_file.pos) / self.current_file.size)
+
     def is_active(self):
         return self.work_timer is not None
 
     def do_pause(self):
+        self._stop_work('pause')
+
+    # waits for the work handler to exit, unless called by a line it is dispatching
+    def _stop_work(self, kind: str):
         if self.work_timer is not None:
             self.must_pause_work = True
-            while self.work_timer is not None and not self.cmd_from_sd:
-                self.reactor.pause(self.reactor.monotonic() + .001)
+            if self._stop_request is None:
+                self._stop_request = (kind, self.reactor.monotonic())
+            if self._work_wake is not None:
+                self._work_wake.complete(None)
+            if not self.cmd_from_sd:
+                self.work_done.wait()
 
     def do_resume(self):
         if self.work_timer is not None:
             raise CommandError("Printer busy")
         self.must_pause_work = False
+        self.work_done = self.reactor.completion()
         self.work_timer = self.reactor.register_timer(self._work_handler, self.reactor.NOW)
 
     def do_cancel(self):
         if self.current_file is not None:
-            self.do_pause()
+            self._stop_work('cancel')
             self.current_file.close()
             self.current_file = None
             self.print_stats.note_cancel()
@@ -258,13 +557,46 @@ class GCodeLoader(VirtualSDCardInterface):
     def handle_webhook_script(self, web_request: WebRequest):
         self.helper.run_script(web_request.get_str('script'))
 
+    def handle_webhook_seek(self, web_request: WebRequest):
+        pos = self._seek(web_request.get_int('line', None), web_request.get_int('position', None))
+        web_request.send({'position': pos, 'line': self._file_line()})
+
+    def handle_webhook_layers(self, web_request: WebRequest):
+        layers = self._layer_map()
+        web_request.send({
+            'current_layer': layers.layer_at(self.current_file.pos) if layers else None,
+            'layers': layers.table if layers else [],
+        })
+
+    def handle_webhook_telemetry(self, web_request: WebRequest):
+        telemetry = self.helper.telemetry
+        enable = web_request.get_boolean('enable', None)
+        if enable is not None:
+            telemetry.set_enabled(enable)
+        if web_request.get_boolean('reset', False):
+            telemetry.reset()
+        web_request.send(telemetry.get_status(histogram=True))
+
     def _load_file(self, filename: str, check_subdirs=False):
         try:
+            file = self.helper.locator.load_file(filename, check_subdirs)
+            file_index = GCodeFileIndex(file, self.cache_path, self.compiled_cache, self.skip_excluded_objects) \
+                if self.file_index_enabled else None
+            skip_objects = file_index is not None and self.skip_excluded_objects
+            compiled = file_index.compiled if file_index is not None else None
             self.current_file = full_file_iterator(
-                self.helper.locator.load_file(filename, check_subdirs),
+                file,
                 self.helper,
-                uninterrupted_macros=self.uninterrupted
+                uninterrupted_macros=self.uninterrupted,
+                prefetch=self.prefetch_lines,
+                objects=file_index.objects if skip_objects else None,
+                excluded=self._excluded_objects if skip_objects else None,
+                # compiled on an earlier print, this one compiles the file for the next one otherwise
+                compiled=compiled if compiled is not None and compiled.mapped is not None else None
             )
+            if file_index is not None:
+                self.file_index = file_index
+                self.file_index.start()
             self.helper.respond_raw(f"File opened: {self.current_file.name} Size: {self.current_file.size}")
             self.helper.respond_raw("File selected")
             self.print_stats.set_current_file(filename)
@@ -272,6 +604,15 @@ class GCodeLoader(VirtualSDCardInterface):
             logging.exception("gcode_loader file open")
             raise FileNotFoundError("Unable to open file")
 
+    # may be called by the prefetch thread, which must not read exclude_object state directly
+    def _excluded_objects(self) -> frozenset[str]:
+        return self._excluded
+
+    def _snapshot_excluded(self):
+        exclude_object = self.helper.printer.lookup_object('exclude_object', None)
+        if exclude_object is not None:
+            self._excluded = frozenset(exclude_object.excluded_objects)
+
     def _load_macro(self, line: str):
         cmd = line.split(maxsplit=1)[0]
         try:
@@ -290,9 +631,12 @@ class GCodeLoader(VirtualSDCardInterface):
 
     def _reset_file(self):
         if self.current_file is not None:
-            self.do_pause()
+            self._stop_work('cancel')
             self.current_file.close()
             self.current_file = None
+        if self.file_index is not None:
+            self.file_index.stop()
+            self.file_index = None
         self.print_stats.reset()
         self.helper.printer.send_event("virtual_sdcard:reset_file")
 
@@ -307,24 +651,59 @@ class GCodeLoader(VirtualSDCardInterface):
             except:
                 logging.exception("gcode_loader shutdown read")
 
+    def _dispatch_batch(self, gcode_mutex):
+        deadline = self.reactor.monotonic() + self.batch_time
+        if self.skip_excluded_objects:
+            self._snapshot_excluded()
+        for _ in range(self.batch_lines):
+            self.helper.run_line(next(self.current_file))
+            # Yield early if pausing, out of time or another request is waiting for the mutex
+            if self.must_pause_work or gcode_mutex.queue or self.reactor.monotonic() >= deadline:
+                break
+
+    def _backoff(self, waketime: float):
+        self._work_wake = self.reactor.completion()
+        self._work_wake.wait(waketime)
+        self._work_wake = None
+
     def _work_handler(self, _):
         logging.info("Starting SD card print (position %d)", self.current_file.pos)
         self.reactor.unregister_timer(self.work_timer)
         self.print_stats.note_start()
 
         gcode_mutex = self.gcode.get_mutex()
+        telemetry = self.helper.telemetry
         error_message = None
         while not self.must_pause_work:
             # Pause if any other request is pending in the gcode class
             if gcode_mutex.test():
-                self.reactor.pause(self.reactor.monotonic() + 0.100)
+                if telemetry.enabled:
+                    start = telemetry.clock()
+                    self._backoff(self.reactor.monotonic() + self.pacer.mutex_backoff())
+                    telemetry.record_mutex_wait(telemetry.clock() - start)
+                    telemetry.record_yield()
+                else:
+                    self._backoff(self.reactor.monotonic() + self.pacer.mutex_backoff())
+                continue
+
+            # Let the toolhead buffer drain when it is full enough
+            now = self.reactor.monotonic()
+            delay = self.pacer.update(now)
+            if delay > 0.:
+                if telemetry.enabled:
+                    telemetry.record_yield()
+                self._backoff(now + delay)
                 continue
 
-            # Dispatch command
+            # Dispatch commands
             self.cmd_from_sd = True
             try:
-                line = next(self.current_file)
-                self.helper.run_script_line(line)
+                # another request may have taken the mutex since it was tested
+                start = telemetry.clock() if telemetry.enabled else None
+                with gcode_mutex:
+                    if start is not None:
+                        telemetry.record_mutex_wait(telemetry.clock() - start)
+                    self._dispatch_batch(gcode_mutex)
             except StopIteration:
                 # End of file
                 self.current_file.close()
@@ -343,6 +722,8 @@ class GCodeLoader(VirtualSDCardInterface):
                 logging.exception(f'gcode_loader worker')
 
             self.cmd_from_sd = False
+            if telemetry.enabled:
+                telemetry.record_yield()
             self.reactor.pause(self.reactor.NOW)
 
         if self.current_file:
@@ -358,6 +739,11 @@ class GCodeLoader(VirtualSDCardInterface):
             self.print_stats.note_pause()
         else:
             self.print_stats.note_complete()
+        if self._stop_request is not None:
+            kind, requested = self._stop_request
+            self.stop_latency[kind].record(self.reactor.monotonic() - requested)
+            self._stop_request = None
+        self.work_done.complete(None)
         return self.reactor.NEVER
 
 
@@ -370,13 +756,16 @@ def load_config(config: ConfigWrapper):
 
     locator = GCodeLocator(os.path.normpath(os.path.expanduser(basedir)))
 
-    helper = GCodeDispatchHelper(printer, printer.lookup_object('gcode'), locator)
+    helper = GCodeDispatchHelper(printer, printer.lookup_object('gcode'), locator,
+                                 render_cache_size=config.getint('render_cache_size', 32, minval=0),
+                                 telemetry=config.getboolean('telemetry', False),
+                                 include_cache_size=config.getint('include_cache_size', 4 * 1024 * 1024, minval=0))
 
     extension = GCodeLoader(helper, config)
 
     printer.objects['virtual_sdcard'] = extension
 
-    printer.objects['gcode_macro'] = PrinterMacro(helper)
+    printer.objects['gcode_macro'] = PrinterMacro(helper, lazy=config.getboolean('lazy_macros', False))
 
     for section in config.get_prefix_sections('gcode_macro '):
         helper.load_macro(section)
@@ -0,0 +1,56 @@
+from __future__ import annotations
+from typing import Callable
+from typing import Optional
+from typing import TYPE_CHECKING
+from .macro.utils import is_classic_gcode
+
+if TYPE_CHECKING:
+    from gcode import GCodeDispatch
+    from .interfaces.macro import MacroInterface
+
+COMMAND_TABLE_LIMIT = 4096  # distinct commands kept, files with garbage lines must not grow it forever
+
+
+class CommandInfo:
+    __slots__ = ('name', 'macro', 'handler', 'classic', 'include')
+
+    def __init__(self, name: str, macro: Optional[MacroInterface], handler: Optional[Callable], classic: bool):
+        self.name = name
+        self.macro = macro
+        self.handler = handler  # None for unknown commands
+        self.classic = classic
+        self.include = name == 'SDCARD_PRINT_FILE'
+
+
+# what every distinct command resolves to, cleared by the helper whenever it changes macros or handlers
+class CommandTable:
+    entries: dict[str, CommandInfo]
+
+    def __init__(self, inner: GCodeDispatch, macros: dict[str, MacroInterface]):
+        self.inner = inner
+        self.macros = macros
+        self.entries = {}
+        self._handlers = inner.gcode_handlers
+
+    def lookup(self, name: str) -> CommandInfo:
+        # klippy swaps handler maps once ready
+        if self.inner.gcode_handlers is not self._handlers:
+            self.clear()
+
+        info = self.entries.get(name)
+        # other modules register and unregister commands without announcing it (manual_probe's ACCEPT, TESTZ, ...),
+        # so the cached handler is checked against the map on every lookup
+        if info is None or self._handlers.get(name) is not info.handler:
+            if len(self.entries) >= COMMAND_TABLE_LIMIT:
+                self.entries.clear()
+            info = self.entries[name] = CommandInfo(
+                name,
+                self.macros.get(name.upper()),
+                self._handlers.get(name),
+                is_classic_gcode(name)
+            )
+        return info
+
+    def clear(self):
+        self.entries.clear()
+        self._handlers = self.inner.gcode_handlers
@@ -0,0 +1,296 @@
+from __future__ import annotations
+from bisect import bisect_right
+import io
+import os
+import struct
+import threading
+from typing import Any
+from typing import BinaryIO
+from typing import NamedTuple
+from typing import Optional
+import zlib
+from ..virtual_sdcard import VALID_GCODE_EXTS
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSED_EXTS = {'gz': 'gzip', 'zst': 'zstd'}
+INPUT_CHUNK_SIZE = 64 * 1024
+OUTPUT_CHUNK_SIZE = 256 * 1024
+CHECKPOINT_INTERVAL = 8 * 1024 * 1024  # uncompressed bytes between access points
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+# compression of a file named like print.gcode.gz, None for plain and unsupported files
+def compression_of(name: str) -> Optional[str]:
+    base, _, ext = name.rpartition('.')
+    compression = COMPRESSED_EXTS.get(ext.lower())
+    if compression is None or base[base.rfind('.') + 1:] not in VALID_GCODE_EXTS:
+        return None
+    if compression == 'zstd' and zstandard is None:
+        return None
+    return compression
+
+
+def is_gcode_name(name: str) -> bool:
+    return name[name.rfind('.') + 1:] in VALID_GCODE_EXTS or compression_of(name) is not None
+
+
+# frame content size from the frame header, None when not recorded
+def _zstd_frame_header(header: bytes) -> Optional[tuple[int, Optional[int], bool]]:
+    if len(header) < 5 or header[:4] != ZSTD_MAGIC:
+        return None
+    descriptor = header[4]
+    single_segment = descriptor >> 5 & 1
+    fcs_size = (1 if single_segment else 0, 2, 4, 8)[descriptor >> 6]
+    pos = 5 + (0 if single_segment else 1) + (0, 1, 2, 4)[descriptor & 3]
+    if len(header) < pos + fcs_size:
+        return None
+    content_size = None
+    if fcs_size:
+        content_size = int.from_bytes(header[pos:pos + fcs_size], 'little') + (256 if fcs_size == 2 else 0)
+    return pos + fcs_size, content_size, bool(descriptor & 4)
+
+
+# sums content sizes of all frames walking block headers, nothing gets decompressed
+def _zstd_size(handle: BinaryIO) -> Optional[int]:
+    total = 0
+    while True:
+        start = handle.tell()
+        header = handle.read(18)
+        if not header:
+            return total
+        magic = int.from_bytes(header[:4], 'little')
+        if 0x184D2A50 <= magic <= 0x184D2A5F and len(header) >= 8:
+            handle.seek(start + 8 + int.from_bytes(header[4:8], 'little'))  # skippable frame
+            continue
+        frame = _zstd_frame_header(header)
+        if frame is None or frame[1] is None:
+            return None
+        header_size, content_size, checksum = frame
+        total += content_size
+        handle.seek(start + header_size)
+        while True:
+            block = handle.read(3)
+            if len(block) < 3:
+                return None
+            block = int.from_bytes(block, 'little')
+            handle.seek((1 if block >> 1 & 3 == 1 else block >> 3), os.SEEK_CUR)
+            if block & 1:
+                break
+        if checksum:
+            handle.seek(4, os.SEEK_CUR)
+
+
+# uncompressed size without decompressing, None when the file doesn't record it
+def uncompressed_size(path: str, compression: str) -> Optional[int]:
+    with open(path, 'rb') as handle:
+        if compression == 'zstd':
+            return _zstd_size(handle)
+
+        # ISIZE trailer keeps the size modulo 2^32, the smallest fitting value not below compressed size wins,
+        # it only covers the last member so multi-member files are underestimated until read through
+        compressed = os.fstat(handle.fileno()).st_size
+        if compressed < 18:
+            return None
+        handle.seek(-4, os.SEEK_END)
+        size = struct.unpack('<I', handle.read(4))[0]
+        if size == 0:
+            return None  # zero padding after the last member, the size isn't recorded at the end
+        while size < compressed:
+            size += 1 << 32
+        return size
+
+
+class Checkpoint(NamedTuple):
+    upos: int  # uncompressed position
+    cpos: int  # compressed position of the first byte not consumed yet
+    state: Any  # decompressor copy, None for a member or frame boundary
+
+
+# access points shared by every reader of a file, like zran
+class CheckpointIndex:
+    checkpoints: list[Checkpoint]
+
+    def __init__(self, interval: int = CHECKPOINT_INTERVAL):
+        self.interval = interval
+        self.checkpoints = [Checkpoint(0, 0, None)]
+        self.positions = [0]
+        self.end: Optional[int] = None  # exact uncompressed size, once any reader got to the end
+        self.lock = threading.Lock()
+
+    def wants(self, upos: int) -> bool:
+        return self.find(upos).upos + self.interval <= upos
+
+    def add(self, checkpoint: Checkpoint):
+        with self.lock:
+            i = bisect_right(self.positions, checkpoint.upos)
+            if self.positions[i - 1] + self.interval > checkpoint.upos:
+                return
+            if i < len(self.positions) and checkpoint.upos + self.interval > self.positions[i]:
+                return
+            self.positions.insert(i, checkpoint.upos)
+            self.checkpoints.insert(i, checkpoint)
+
+    # last access point at or before given uncompressed position
+    def find(self, upos: int) -> Checkpoint:
+        with self.lock:
+            return self.checkpoints[bisect_right(self.positions, upos) - 1]
+
+
+class GzipDecoder:
+    magic = GZIP_MAGIC
+    copyable = True
+
+    def __init__(self, state: Any = None):
+        self.decompressor = state.copy() if state is not None else zlib.decompressobj(zlib.MAX_WBITS | 16)
+
+    # returns output, input left over and end of member/frame
+    def decompress(self, data: bytes) -> tuple[bytes, bytes, bool]:
+        output = self.decompressor.decompress(data, OUTPUT_CHUNK_SIZE)
+        if self.decompressor.eof:
+            return output, self.decompressor.unused_data, True
+        return output, self.decompressor.unconsumed_tail, False
+
+    def state(self) -> Any:
+        return self.decompressor.copy()
+
+
+class ZstdDecoder:
+    magic = ZSTD_MAGIC
+    copyable = False
+
+    def __init__(self, state: Any = None):
+        self.decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data: bytes) -> tuple[bytes, bytes, bool]:
+        output = self.decompressor.decompress(data)
+        if self.decompressor.eof:
+            return output, self.decompressor.unused_data, True
+        return output, b'', False
+
+    def state(self) -> Any:
+        return None
+
+
+DECODERS = {'gzip': GzipDecoder, 'zstd': ZstdDecoder}
+
+
+# raw stream of decompressed data, seeks restart from the nearest access point
+class DecompressingReader(io.RawIOBase):
+    def __init__(self, path: str, compression: str, checkpoints: CheckpointIndex):
+        self.handle = open(path, 'rb')
+        self.decoder_type = DECODERS[compression]
+        self.checkpoints = checkpoints
+        self._restore(checkpoints.find(0))
+
+    def _restore(self, checkpoint: Checkpoint):
+        self.handle.seek(checkpoint.cpos)
+        self.decoder = self.decoder_type(checkpoint.state)
+        self._input = b''
+        self._cpos = checkpoint.cpos  # compressed position of _input start
+        self._output = b''
+        self._output_pos = 0
+        self._upos = checkpoint.upos  # uncompressed position of _output start
+        self._boundary = checkpoint.state is None  # at the start of a member/frame
+        self._eof = False
+
+    def _decompress(self) -> bool:
+        magic = self.decoder.magic
+        while not self._eof:
+            if not self._input or (self._boundary and len(self._input) < len(magic)):
+                data = self.handle.read(INPUT_CHUNK_SIZE)
+                if not data:
+                    self._eof = True
+                    return False
+                self._input += data
+
+            if self._boundary:
+                # members/frames may be followed by zero padding, anything else ends the stream
+                stripped = self._input.lstrip(b'\0')
+                self._cpos += len(self._input) - len(stripped)
+                self._input = stripped
+                if len(self._input) < len(magic):
+                    continue
+                if not self._input.startswith(magic):
+                    self._eof = True
+                    return False
+                self._boundary = False
+
+            size = len(self._input)
+            output, self._input, end = self.decoder.decompress(self._input)
+            self._cpos += size - len(self._input)
+            if end:
+                # next member/frame starts from scratch, a natural access point
+                self._boundary = True
+                self.decoder = self.decoder_type()
+
+            if output:
+                self._upos += len(self._output)
+                self._output = output
+                self._output_pos = 0
+                end_pos = self._upos + len(output)
+                if (end or self.decoder.copyable) and self.checkpoints.wants(end_pos):
+                    state = None if end else self.decoder.state()
+                    self.checkpoints.add(Checkpoint(end_pos, self._cpos, state))
+                return True
+        return False
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def _at_end(self):
+        self._output_pos = len(self._output)
+        self.checkpoints.end = self.tell()
+
+    def readinto(self, buffer) -> int:
+        if self._output_pos >= len(self._output) and not self._decompress():
+            self._at_end()
+            return 0
+        size = min(len(buffer), len(self._output) - self._output_pos)
+        buffer[:size] = self._output[self._output_pos:self._output_pos + size]
+        self._output_pos += size
+        return size
+
+    def tell(self) -> int:
+        return self._upos + self._output_pos
+
+    def seek(self, pos: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            pos += self.tell()
+        elif whence == io.SEEK_END:
+            raise io.UnsupportedOperation('seek from end of compressed file')
+
+        if self._upos <= pos <= self._upos + len(self._output):
+            self._output_pos = pos - self._upos
+            return pos
+
+        checkpoint = self.checkpoints.find(pos)
+        if pos < self.tell() or checkpoint.upos > self.tell():
+            self._restore(checkpoint)
+
+        # skip forward through decompressed data
+        while pos > self._upos + len(self._output):
+            if not self._decompress():
+                self._at_end()
+                return self.tell()
+        self._output_pos = pos - self._upos
+        return pos
+
+    def close(self):
+        if not self.closed:
+            self.handle.close()
+        super().close()
+
+
+def open_gcode(path: str, compression: Optional[str], buffer_size: int,
+               checkpoints: Optional[CheckpointIndex] = None) -> BinaryIO:
+    if compression is None:
+        return open(path, 'rb', buffering=buffer_size)
+    return io.BufferedReader(DecompressingReader(path, compression, checkpoints or CheckpointIndex()), buffer_size)
@@ -11,17 +11,24 @@ from configfile import ConfigWrapper
 from configfile import error as ConfigError
 from extras.gcode_macro import GetStatusWrapper
 from gcode import CommandError
+from .commands import CommandTable
+from .iterator import IncludeCache
 from .iterator import full_macro_iterator
 from .iterator import full_script_iterator
 from .line import CommandLineError
 from .line import LineError
 from .mock.gcode_command import GCodeCommand
 from .macro import Macro
+from .stats import MacroProfiler
+from .stats import Telemetry
 
 if TYPE_CHECKING:
     from gcode import GCodeDispatch
     from klippy import Printer
     from .macro import PrinterMacro
+    from .macro import VariableMode
+    from .macro.reload import PreparedReload
+    from .macro.template import MacroTemplate
     from .line import GCodeLine
     from .locator import GCodeLocator
     from .iterator import GCodeIterator
@@ -30,18 +37,29 @@ if TYPE_CHECKING:
 
 
 class GCodeDispatchHelper:
-    def __init__(self, printer: Printer, inner: GCodeDispatch, locator: GCodeLocator):
+    telemetry: Telemetry
+    profiler: MacroProfiler
+    include_cache: IncludeCache
+    commands: CommandTable
+
+    def __init__(self, printer: Printer, inner: GCodeDispatch, locator: GCodeLocator, render_cache_size: int = 0,
+                 telemetry: bool = False, include_cache_size: int = 0):
         self._registry: dict[str: MacroInterface] = {}
         self._inner = inner
         self.printer = printer
         self.locator = locator
+        self.render_cache_size = render_cache_size
+        self.telemetry = Telemetry(telemetry)
+        self.profiler = MacroProfiler()
+        self.include_cache = IncludeCache(include_cache_size)
+        self.commands = CommandTable(inner, self._registry)
 
     @cached_property
     def gcode_macro(self) -> PrinterMacro:
         return self.printer.lookup_object('gcode_macro')
 
-    def load_macro(self, macro_config: ConfigWrapper, verbose: bool = False):
-        macro = Macro(self, macro_config, self.gcode_macro)
+    def load_macro(self, macro_config: ConfigWrapper, verbose: bool = False, template: Optional[MacroTemplate] = None):
+        macro = Macro(self, macro_config, self.gcode_macro, template=template)
         if macro.rename_existing is not None:
             def handle_connect():
                 self.rename_command(macro.alias, macro.rename_existing)
@@ -56,6 +74,7 @@ class GCodeDispatchHelper:
 
         self.printer.objects[f'gcode_macro {macro.name}'] = macro
         self._registry[macro.alias] = macro
+        self.commands.clear()
 
         if verbose:
             self.respond_info(f"Added {macro.alias}")
@@ -84,6 +103,7 @@ class GCodeDispatchHelper:
             del self.printer.objects[key]
 
         del self._registry[macro_name]
+        self.commands.clear()
 
         if verbose:
             self.respond_info(f"Removed {macro_name}")
@@ -96,6 +116,7 @@ class GCodeDispatchHelper:
         if orig is None:
             raise ConfigError(f"Existing command '{old_name}' not found in gcode_macro rename")
         self._inner.register_command(new_name, orig)
+        self.commands.clear()
 
         if old_name in self._inner.gcode_help:
             self.set_macro_description(new_name, self.get_macro_description(old_name))
@@ -129,6 +150,31 @@ class GCodeDispatchHelper:
     def get_macros(self):
         return self._registry.keys()
 
+    # applies prepared reload in one go, must not yield to the reactor
+    def apply_macro_reload(self, prepared: PreparedReload, vars_mode: VariableMode, name_filter: Optional[str] = None):
+        for name, macro in prepared.macros.items():
+            if macro.error is not None:
+                self.respond_info(f'Skipped {name} - template error: {macro.error}')
+            elif self.has_macro(name):
+                self.get_macro(name).update_config(macro.config, vars_mode, verbose=True, template=macro.template)
+            else:
+                self.load_macro(macro.config, verbose=True, template=macro.template)
+
+        for name in list(self.get_macros()):
+            if name_filter is not None and name != name_filter:
+                continue
+
+            if name not in prepared.macros:
+                self.remove_macro(name, verbose=True)
+
+    def get_render_cache_status(self) -> dict[str, int]:
+        hits = misses = entries = 0
+        for macro in self._registry.values():
+            hits += macro.render_cache.hits
+            misses += macro.render_cache.misses
+            entries += len(macro.render_cache.entries)
+        return {'hits': hits, 'misses': misses, 'entries': entries}
+
     def run_script_from_command(self, script: str, name: Optional[str] = None):
         if name is None:
             iterator = full_script_iterator(script, self)
@@ -218,10 +264,30 @@ class GCodeDispatchHelper:
             raise
 
     def _run_line(self, line: GCodeLine, need_ack: bool = False):
+        telemetry = self.telemetry
+        profiler = self.profiler
+        if not telemetry.enabled and not profiler.enabled:
+            return self._dispatch_line(line, need_ack)
+
+        frame = profiler.begin_dispatch(line) if profiler.enabled else None
+        start = telemetry.clock()
+        try:
+            self._dispatch_line(line, need_ack)
+        finally:
+            elapsed = telemetry.clock() - start
+            if telemetry.enabled:
+                telemetry.record_command(line.cmd, elapsed)
+            if frame is not None:
+                profiler.end_dispatch(frame, elapsed)
+
+    def _dispatch_line(self, line: GCodeLine, need_ack: bool = False):
         gcmd = GCodeCommand(self, line, need_ack)
-        handler = self._inner.gcode_handlers.get(gcmd.get_command(), partial(self._line_cmd_default, line))
+        handler = self.commands.lookup(line.cmd).handler
         try:
-            handler(gcmd)
+            if handler is None:
+                self._line_cmd_default(line, gcmd)
+            else:
+                handler(gcmd)
         except CommandError as e:
             if not need_ack:
                 raise CommandLineError(line, e)
@@ -1,17 +1,102 @@
 from __future__ import annotations
 from functools import cached_property
+import io
+import logging
+import threading
+from typing import BinaryIO
+from typing import Optional
 import os
+from .compression import CheckpointIndex
+from .compression import compression_of
+from .compression import open_gcode
+from .compression import uncompressed_size
 
 
 class GCodeFile:
-    def __init__(self, basedir: str, name: str):
+    def __init__(self, basedir: str, name: str, size: Optional[int] = None, mtime: Optional[int] = None):
         self._basedir = basedir
         self.name = name
+        self._size = size
+        self._mtime = mtime  # of the file size was given for
+        self._measuring = False
 
     @cached_property
     def path(self):
         return os.path.join(self._basedir, self.name)
 
     @cached_property
-    def size(self):
-        return os.path.getsize(self.path)
+    def compression(self) -> Optional[str]:
+        return compression_of(self.name)
+
+    # positions and sizes of compressed files are in uncompressed bytes, 0 until the exact size is known so the size
+    # and progress of a print never change to another value on the way
+    @property
+    def size(self) -> int:
+        size = self.exact_size
+        if size is None:
+            self._measure()
+            return 0
+        return size
+
+    # for listings, gzip trailers only cover the last member so theirs is a guess, measured in a thread on first use,
+    # the compressed size stands in until then
+    @property
+    def listed_size(self) -> int:
+        size = self.exact_size
+        if size is not None:
+            return size
+        if self._size is None:
+            self._measure()
+            return os.path.getsize(self.path)
+        return self._size
+
+    # None for compressed files until a reader got to their end or an index recorded it
+    @property
+    def exact_size(self) -> Optional[int]:
+        if self.compression is None:
+            if self._size is None:
+                self._size = os.path.getsize(self.path)
+            return self._size
+        return self.checkpoints.end
+
+    # drops sizes known for an earlier version of the file
+    def refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+        if self._mtime == stat.st_mtime_ns:
+            return
+        self._mtime = stat.st_mtime_ns
+        self._size = stat.st_size if self.compression is None else None
+        self._measuring = False
+        self.__dict__.pop('checkpoints', None)
+
+    def note_size(self, size: int):
+        if self.compression is not None:
+            self.checkpoints.end = size
+
+    def _measure(self):
+        if self._measuring:
+            return
+        self._measuring = True
+        threading.Thread(target=self._run_measure, args=(self.checkpoints,), name='gcode_loader size',
+                         daemon=True).start()
+
+    def _run_measure(self, checkpoints: CheckpointIndex):
+        try:
+            size = uncompressed_size(self.path, self.compression)
+        except OSError:
+            logging.exception(f'gcode_loader size {self.path}')
+            return
+        self._size = size
+        # Zstandard frame headers record their exact content size
+        if size is not None and self.compression == 'zstd' and checkpoints.end is None:
+            checkpoints.end = size
+
+    @cached_property
+    def checkpoints(self) -> CheckpointIndex:
+        return CheckpointIndex()
+
+    def open(self, buffer_size: int = io.DEFAULT_BUFFER_SIZE) -> BinaryIO:
+        return open_gcode(self.path, self.compression, buffer_size, self.checkpoints)
@@ -0,0 +1,6 @@
+from .compiled_index import CompiledIndex
+from .file_index import GCodeFileIndex
+from .layer_map import LayerMap
+from .line_index import LineIndex
+from .object_index import ObjectIndex, ObjectRange
+from .scanner import FileScanner, ScanCollector
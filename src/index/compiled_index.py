@@ -0,0 +1,185 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_right
+import logging
+import mmap
+import os
+import struct
+from typing import BinaryIO
+from typing import Optional
+from typing import TYPE_CHECKING
+from .scanner import ScanCollector
+from ..line.tokenizer import tokenize_spans
+
+if TYPE_CHECKING:
+    from ..file import GCodeFile
+
+COMPILED_MAGIC = b'GCCF'
+COMPILED_VERSION = 2
+# magic, version, size, records, block table offset, command table offset
+COMPILED_HEADER = struct.Struct('<4sIQQQQ')
+# bytes to the next record's line (or to the end of file), leading whitespace, command id,
+# stripped line length, params source span within stripped line
+COMPILED_RECORD = struct.Struct('<IBHHBH')
+COMPILED_BLOCK = 1024  # records between absolute offsets kept for seeking
+UNCOMPILED = 0xFFFF  # command id of lines left to the tokenizer: too long, not ascii or command table full
+
+
+# every line but comments, already tokenized, so reprints skip comments and text parsing; the G-code itself is still
+# read for the line text, params aren't stored split: their text would make the cache larger than the file and a dict
+# built from stored spans is hardly faster than splitting the params source
+class CompiledIndex(ScanCollector):
+    mapped: Optional[mmap.mmap]
+    commands: list[str]
+    count: int
+    blocks: array
+
+    def __init__(self, file: GCodeFile, sidecar: str):
+        self.file = file
+        self.sidecar = sidecar
+        self.mapped = None
+        self.commands = []
+        self.count = 0
+        self.size = 0
+        self.blocks = array('Q')
+        self.ready = False
+        self._output: Optional[BinaryIO] = None
+        self._ids: dict[str, int] = {}
+        self._last: Optional[tuple] = None  # written once the next record's offset is known
+        self._load()
+
+    # index and offset of the first record at or after given position
+    def find(self, pos: int) -> tuple[int, int]:
+        block = max(bisect_right(self.blocks, pos) - 1, 0)
+        index = block * COMPILED_BLOCK
+        offset = self.blocks[block] if self.blocks else self.size
+        record = COMPILED_HEADER.size + index * COMPILED_RECORD.size
+        while index < self.count and offset < pos:
+            offset += struct.unpack_from('<I', self.mapped, record)[0]
+            record += COMPILED_RECORD.size
+            index += 1
+        return index, offset
+
+    def _command_id(self, command: str) -> int:
+        command_id = self._ids.get(command)
+        if command_id is None:
+            if len(self.commands) >= UNCOMPILED:
+                return UNCOMPILED
+            command_id = self._ids[command] = len(self.commands)
+            self.commands.append(command)
+        return command_id
+
+    def _compile(self, raw: bytes) -> Optional[tuple[int, int, int, int, int]]:
+        if not raw.isascii():
+            return 0, UNCOMPILED, 0, 0, 0
+
+        text = raw.decode('ascii')
+        data = text.strip()
+        tokens = tokenize_spans(data)
+        if tokens is None:
+            return None
+
+        command, args_start, args_end = tokens
+        lead = len(text) - len(text.lstrip())
+        if lead > 0xFF or args_start > 0xFF or len(data) > 0xFFFF:
+            return 0, UNCOMPILED, 0, 0, 0
+        return lead, self._command_id(command), len(data), args_start, args_end
+
+    def _add(self, records: list[bytes], raw: bytes, offset: int):
+        fields = self._compile(raw)
+        if fields is None:
+            return
+        if self._last is not None:
+            last_offset, last_fields = self._last
+            records.append(COMPILED_RECORD.pack(offset - last_offset, *last_fields))
+        if self.count % COMPILED_BLOCK == 0:
+            self.blocks.append(offset)
+        self._last = (offset, fields)
+        self.count += 1
+
+    def feed(self, chunk: bytes, offset: int):
+        if self.ready:
+            return
+        if self._output is None:
+            try:
+                self._output = open(self.sidecar + '.tmp', 'wb')
+                self._output.write(COMPILED_HEADER.pack(COMPILED_MAGIC, 0, 0, 0, 0, 0))
+            except OSError:
+                logging.exception(f'gcode_loader compiled index {self.sidecar}')
+                self.ready = True  # nothing to compile into
+                return
+
+        parts = chunk.split(b'\n')
+        last = parts.pop()
+        records = []
+        for raw in parts:
+            self._add(records, raw, offset)
+            offset += len(raw) + 1
+        if last:
+            self._add(records, last, offset)
+        self._output.write(b''.join(records))
+
+    def finish(self, size: int):
+        if self.ready:
+            return
+        self.ready = True
+        self.size = size
+        if self._output is None:
+            return  # empty file, nothing to map
+
+        tmp = self.sidecar + '.tmp'
+        try:
+            with self._output as output:
+                if self._last is not None:
+                    last_offset, last_fields = self._last
+                    output.write(COMPILED_RECORD.pack(size - last_offset, *last_fields))
+                blocks = output.tell()
+                self.blocks.tofile(output)
+                table = output.tell()
+                output.write('\n'.join(self.commands).encode('utf-8'))
+                output.seek(0)
+                output.write(COMPILED_HEADER.pack(COMPILED_MAGIC, COMPILED_VERSION, size, self.count, blocks, table))
+            os.replace(tmp, self.sidecar)
+        except OSError:
+            logging.exception(f'gcode_loader compiled index save {self.sidecar}')
+        finally:
+            self._output = None
+
+    # compiled data only gets used when it was saved for this very file, otherwise lines are read as text
+    def _load(self):
+        try:
+            with open(self.sidecar, 'rb') as handle:
+                mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return
+
+        try:
+            magic, version, size, records, blocks, table = COMPILED_HEADER.unpack_from(mapped)
+        except struct.error:
+            mapped.close()
+            return
+        block_count = -(-records // COMPILED_BLOCK)
+        if magic != COMPILED_MAGIC or version != COMPILED_VERSION or size != self.file.size \
+                or blocks != COMPILED_HEADER.size + records * COMPILED_RECORD.size \
+                or table != blocks + block_count * 8 or table > len(mapped):
+            mapped.close()
+            return
+
+        self.mapped = mapped
+        self.blocks = array('Q', mapped[blocks:table])
+        self.commands = mapped[table:].decode('utf-8').split('\n')
+        self.count = records
+        self.size = size
+        self.ready = True
+
+    def close(self):
+        if self._output is not None:
+            self._output.close()
+            self._output = None
+            try:
+                os.remove(self.sidecar + '.tmp')
+            except OSError:
+                pass
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
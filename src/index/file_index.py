@@ -0,0 +1,59 @@
+from __future__ import annotations
+import hashlib
+import os
+from typing import Optional
+from typing import TYPE_CHECKING
+from .compiled_index import CompiledIndex
+from .layer_map import LayerMap
+from .line_index import LineIndex
+from .object_index import ObjectIndex
+from .scanner import FileScanner
+
+if TYPE_CHECKING:
+    from ..file import GCodeFile
+
+
+# sidecar files are keyed by path, mtime and size so stale ones are never picked up
+def sidecar_path(cache_path: str, path: str, suffix: str) -> str:
+    stat = os.stat(path)
+    key = hashlib.sha1(f'{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}'.encode('utf-8')).hexdigest()
+    return os.path.join(cache_path, f'{key}.{suffix}')
+
+
+class GCodeFileIndex:
+    lines: LineIndex
+    layers: LayerMap
+    objects: Optional[ObjectIndex]
+    compiled: Optional[CompiledIndex]
+
+    def __init__(self, file: GCodeFile, cache_path: Optional[str] = None, compile: bool = False,
+                 objects: bool = False):
+        self.file = file
+        self.lines = LineIndex(file, self._sidecar(cache_path, 'lines'))
+        self.layers = LayerMap(file, self._sidecar(cache_path, 'layers'))
+        collectors = [self.lines, self.layers]
+        # object ranges aren't stored, collecting them always scans the file
+        self.objects = None
+        if objects:
+            self.objects = ObjectIndex()
+            collectors.append(self.objects)
+        # compiled lines are mapped straight from the file, which compressed files can't do
+        self.compiled = None
+        if compile and cache_path is not None and file.compression is None:
+            self.compiled = CompiledIndex(file, self._sidecar(cache_path, 'compiled'))
+            collectors.append(self.compiled)
+        self.scanner = FileScanner(file, collectors)
+
+    def _sidecar(self, cache_path: Optional[str], suffix: str) -> Optional[str]:
+        if cache_path is None:
+            return None
+        return sidecar_path(cache_path, self.file.path, suffix)
+
+    def start(self):
+        self.scanner.start()
+
+    def stop(self):
+        self.scanner.stop()
+        self.lines.close()
+        if self.compiled is not None:
+            self.compiled.close()
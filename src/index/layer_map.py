@@ -0,0 +1,111 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_right
+import logging
+import os
+import re
+import struct
+from typing import Optional
+from typing import TYPE_CHECKING
+from .scanner import ScanCollector
+
+if TYPE_CHECKING:
+    from ..file import GCodeFile
+
+LAYER_REGEX = re.compile(
+    rb'^[ \t]*(?:;[ \t]*LAYER_CHANGE|SET_PRINT_STATS_INFO\b[^;\n]*\bCURRENT_LAYER=(\d+))',
+    re.MULTILINE | re.IGNORECASE
+)
+LAYER_MAP_MAGIC = b'GCLM'
+LAYER_MAP_VERSION = 1
+LAYER_MAP_HEADER = struct.Struct('<4sIQQ')  # magic, version, layers, size
+
+
+class LayerMap(ScanCollector):
+    layers: list[int]
+    offsets: list[int]
+
+    def __init__(self, file: Optional[GCodeFile] = None, sidecar: Optional[str] = None):
+        self.file = file
+        self.sidecar = sidecar
+        self.layers = []
+        self.offsets = []
+        self.ready = False
+        self._explicit: dict[int, int] = {}
+        self._changes: list[int] = []
+        if sidecar is not None:
+            self._load()
+
+    def feed(self, chunk: bytes, offset: int):
+        for match in LAYER_REGEX.finditer(chunk):
+            layer = match.group(1)
+            if layer is None:
+                self._changes.append(offset + match.start())
+            else:
+                self._explicit.setdefault(int(layer), offset + match.start())
+
+    def finish(self, size: int):
+        # explicit layer numbers are preferred over counting layer change comments
+        if self._explicit:
+            layers = sorted(self._explicit.items(), key=lambda item: item[1])
+        else:
+            layers = list(enumerate(self._changes, start=1))
+        self.layers = [layer for layer, _ in layers]
+        self.offsets = [offset for _, offset in layers]
+        self._explicit = {}
+        self._changes = []
+        self.ready = True
+        if self.sidecar is not None:
+            self._save(size)
+
+    def layer_at(self, pos: int) -> Optional[int]:
+        i = bisect_right(self.offsets, pos) - 1
+        if i < 0:
+            return None
+        return self.layers[i]
+
+    def layer_offset(self, layer: int) -> int:
+        try:
+            return self.offsets[self.layers.index(layer)]
+        except ValueError:
+            raise IndexError(f'layer {layer} not found')
+
+    @property
+    def start(self) -> Optional[int]:
+        return self.offsets[0] if self.offsets else None
+
+    # [layer, offset] pairs
+    @property
+    def table(self) -> list[list[int]]:
+        return [[layer, offset] for layer, offset in zip(self.layers, self.offsets)]
+
+    def _load(self):
+        try:
+            with open(self.sidecar, 'rb') as handle:
+                magic, version, count, size = LAYER_MAP_HEADER.unpack(handle.read(LAYER_MAP_HEADER.size))
+                if magic != LAYER_MAP_MAGIC or version != LAYER_MAP_VERSION or self.file.exact_size not in (None, size):
+                    return
+                pairs = array('Q')
+                pairs.frombytes(handle.read())
+        except (OSError, struct.error, ValueError):
+            return
+
+        if len(pairs) != 2 * count:
+            return
+        self.layers = pairs[0::2].tolist()
+        self.offsets = pairs[1::2].tolist()
+        self.ready = True
+        self.file.note_size(size)
+
+    def _save(self, size: int):
+        pairs = array('Q')
+        for layer, offset in zip(self.layers, self.offsets):
+            pairs.extend((layer, offset))
+        tmp = self.sidecar + '.tmp'
+        try:
+            with open(tmp, 'wb') as handle:
+                handle.write(LAYER_MAP_HEADER.pack(LAYER_MAP_MAGIC, LAYER_MAP_VERSION, len(self.layers), size))
+                pairs.tofile(handle)
+            os.replace(tmp, self.sidecar)
+        except OSError:
+            logging.exception(f'gcode_loader layer map save {self.sidecar}')
@@ -0,0 +1,142 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from itertools import islice
+import logging
+import os
+import struct
+from typing import BinaryIO
+from typing import Optional
+from typing import TYPE_CHECKING
+from .scanner import ScanCollector
+
+if TYPE_CHECKING:
+    from ..file import GCodeFile
+
+LINE_INDEX_STRIDE = 1024
+LINE_INDEX_MAGIC = b'GCLI'
+LINE_INDEX_VERSION = 1
+LINE_INDEX_HEADER = struct.Struct('<4sIIQQ')  # magic, version, stride, lines, size
+
+
+class LineIndex(ScanCollector):
+    offsets: array
+    lines: int
+    size: int
+
+    def __init__(self, file: GCodeFile, sidecar: Optional[str] = None, stride: int = LINE_INDEX_STRIDE):
+        self.file = file
+        self.handle: Optional[BinaryIO] = None
+        self.sidecar = sidecar
+        self.stride = stride
+        self.offsets = array('Q', [0])
+        self.lines = 0
+        self.size = 0
+        self.ready = False
+        self._last: tuple[int, int] = (0, 0)  # position, lines before it
+        if sidecar is not None:
+            self._load()
+
+    # offsets[i] is the start of line i * stride + 1
+    def feed(self, chunk: bytes, offset: int):
+        parts = chunk.split(b'\n')
+        complete = len(parts) - 1
+        first = self.stride - self.lines % self.stride - 1
+        ends = islice(accumulate(map(len, parts[:complete])), first, None, self.stride)
+        for i, end in enumerate(ends):
+            self.offsets.append(offset + end + first + i * self.stride + 1)
+        self.lines += complete
+        if parts[-1]:
+            self.lines += 1
+
+    def finish(self, size: int):
+        self.size = size
+        self.ready = True
+        if self.sidecar is not None:
+            self._save(size)
+
+    # kept open, reads mostly move forward which is cheap for compressed files too
+    def _read(self, start: int, end: int) -> bytes:
+        if self.handle is None:
+            self.handle = self.file.open()
+        self.handle.seek(start)
+        return self.handle.read(end - start)
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+    # number of lines fully before given position, equals 1-based number of the last line read
+    def lines_before(self, pos: int) -> int:
+        last_pos, last_lines = self._last
+        if pos == last_pos:
+            return last_lines
+
+        block = bisect_right(self.offsets, pos) - 1
+        start, lines = self.offsets[block], block * self.stride
+        if last_pos > start and pos > last_pos:
+            start, lines = last_pos, last_lines
+        lines += self._read(start, pos).count(b'\n')
+        self._last = (pos, lines)
+        return lines
+
+    # byte offset at which 1-based line starts
+    def line_offset(self, line: int) -> int:
+        if line < 1 or line > self.lines:
+            raise IndexError(f'line {line} out of range')
+
+        block = (line - 1) // self.stride
+        start = self.offsets[block]
+        skip = (line - 1) - block * self.stride
+        if skip == 0:
+            return start
+
+        end = self.offsets[block + 1] if block + 1 < len(self.offsets) else self.size
+        data = self._read(start, end)
+        pos = -1
+        for _ in range(skip):
+            pos = data.find(b'\n', pos + 1)
+        return start + pos + 1
+
+    # start of the line containing given position
+    def snap(self, pos: int) -> int:
+        block = bisect_right(self.offsets, pos) - 1
+        start = self.offsets[block]
+        return start + self._read(start, pos).rfind(b'\n') + 1
+
+    def _load(self):
+        try:
+            with open(self.sidecar, 'rb') as handle:
+                magic, version, stride, lines, size = LINE_INDEX_HEADER.unpack(handle.read(LINE_INDEX_HEADER.size))
+                if magic != LINE_INDEX_MAGIC or version != LINE_INDEX_VERSION \
+                        or self.file.exact_size not in (None, size):
+                    return
+                offsets = array('Q')
+                offsets.frombytes(handle.read())
+        except (OSError, struct.error, ValueError):
+            return
+
+        # a truncated or corrupted sidecar is rebuilt by the scan, the last line may lack its newline
+        if stride < 1 or len(offsets) not in (1 + lines // stride, 1 + max(lines - 1, 0) // stride):
+            return
+        if offsets[0] != 0 or offsets[-1] > size or any(a >= b for a, b in zip(offsets, islice(offsets, 1, None))):
+            return
+
+        self.stride = stride
+        self.lines = lines
+        self.offsets = offsets
+        self.size = size
+        self.ready = True
+        self.file.note_size(size)  # sidecars are keyed by the file on disk, so compressed ones know it exactly
+
+    def _save(self, size: int):
+        tmp = self.sidecar + '.tmp'
+        try:
+            with open(tmp, 'wb') as handle:
+                handle.write(LINE_INDEX_HEADER.pack(LINE_INDEX_MAGIC, LINE_INDEX_VERSION, self.stride, self.lines, size))
+                self.offsets.tofile(handle)
+            os.replace(tmp, self.sidecar)
+        except OSError:
+            logging.exception(f'gcode_loader line index save {self.sidecar}')
@@ -0,0 +1,96 @@
+from __future__ import annotations
+from bisect import bisect_left
+import re
+from typing import NamedTuple
+from typing import Optional
+from .scanner import ScanCollector
+
+OBJECT_REGEX = re.compile(rb'^[ \t]*EXCLUDE_OBJECT_(START|END)\b([^;\n]*)', re.MULTILINE | re.IGNORECASE)
+OBJECT_NAME_REGEX = re.compile(rb'\bNAME=("[^"]*"|\'[^\']*\'|\S+)', re.IGNORECASE)
+# every command except moves and comments still has to run when an object is skipped, like exclude_object does,
+# replayed between the object's own start and end so moves made by macros are still filtered by exclude_object
+STATE_REGEX = re.compile(rb'^[ \t]*(?![Gg][0-3](?![\d.])|;|\r?$)[^\n]*\n?', re.MULTILINE)
+EXTRUDER_REGEX = re.compile(rb'[ \t]*[Gg](?:[0-3]|92)(?![\d.])[^;\n]*[ \t][Ee](-?\d*\.?\d+)')
+Z_REGEX = re.compile(rb'[ \t]*[Gg][0-3](?![\d.])[^;\n]*[ \t][Zz](-?\d*\.?\d+)')
+FEEDRATE_REGEX = re.compile(rb'[ \t]*[Gg][0-3](?![\d.])[^;\n]*[ \t][Ff](\d*\.?\d+)')
+# values the skipped moves would have left behind, in the order they're restored
+POSITION_REGEXES = (Z_REGEX, FEEDRATE_REGEX, EXTRUDER_REGEX)
+
+
+class ObjectRange(NamedTuple):
+    start: int
+    end: int
+    name: str
+    restore: list[bytes]
+
+
+def last_match(regex: re.Pattern, data: bytes, start: int, end: int) -> Optional[re.Match]:
+    while end > start:
+        line_start = max(data.rfind(b'\n', start, end - 1) + 1, start)
+        match = regex.match(data, line_start, end)
+        if match is not None:
+            return match
+        end = line_start
+    return None
+
+
+class ObjectIndex(ScanCollector):
+    ranges: list[ObjectRange]
+    starts: list[int]
+
+    def __init__(self):
+        self.ranges = []
+        self.starts = []
+        self.ready = False
+        self._open: Optional[tuple[int, str, list[bytes], list[Optional[bytes]]]] = None
+
+    def _collect(self, chunk: bytes, start: int, end: int):
+        range_start, name, restore, position = self._open
+        restore.extend(match.group(0) for match in STATE_REGEX.finditer(chunk, start, end))
+        for i, regex in enumerate(POSITION_REGEXES):
+            match = last_match(regex, chunk, start, end)
+            if match is not None:
+                position[i] = match.group(1)
+
+    def feed(self, chunk: bytes, offset: int):
+        pos = 0
+        for match in OBJECT_REGEX.finditer(chunk):
+            if self._open is not None:
+                self._collect(chunk, pos, match.start())
+
+            line_end = chunk.find(b'\n', match.end())
+            line_end = len(chunk) if line_end < 0 else line_end + 1
+            pos = line_end
+
+            if match.group(1).upper() == b'START':
+                name = OBJECT_NAME_REGEX.search(match.group(2))
+                if name is None:
+                    self._open = None
+                    continue
+                name = name.group(1).strip(b'"\'').decode('utf-8', errors='replace').upper()
+                position = [None] * len(POSITION_REGEXES)
+                self._open = (offset + match.start(), name, [chunk[match.start():line_end]], position)
+            elif self._open is not None:
+                range_start, name, restore, (z, feedrate, extruder) = self._open
+                restore.append(chunk[match.start():line_end])
+                # moves are dropped, so leave Z, feedrate and extruder where the object would have left them,
+                # slicers like Cura change layer height inside of object blocks
+                move = (b' Z' + z if z is not None else b'') + (b' F' + feedrate if feedrate is not None else b'')
+                if move:
+                    restore.append(b'G1' + move + b'\n')
+                if extruder is not None:
+                    restore.append(b'G92 E' + extruder + b'\n')
+                self.ranges.append(ObjectRange(range_start, offset + line_end, name, restore))
+                self._open = None
+
+        if self._open is not None:
+            self._collect(chunk, pos, len(chunk))
+
+    def finish(self, size: int):
+        self._open = None
+        self.starts = [r.start for r in self.ranges]
+        self.ready = True
+
+    # index of the first range starting at or after given position
+    def find(self, pos: int) -> int:
+        return bisect_left(self.starts, pos)
@@ -0,0 +1,80 @@
+from __future__ import annotations
+from abc import abstractmethod
+import logging
+import threading
+from typing import Optional
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ..file import GCodeFile
+
+SCAN_CHUNK_SIZE = 1024 * 1024
+
+
+class ScanCollector:
+    ready: bool = False
+
+    # chunk always ends on a line boundary, offset is the byte position of its first character
+    @abstractmethod
+    def feed(self, chunk: bytes, offset: int):
+        pass
+
+    def finish(self, size: int):
+        self.ready = True
+
+
+class FileScanner:
+    thread: Optional[threading.Thread]
+
+    def __init__(self, file: GCodeFile, collectors: list[ScanCollector]):
+        self.file = file
+        self.collectors = collectors
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if all(c.ready for c in self.collectors):
+            return
+        self.thread = threading.Thread(target=self._run, name='gcode_loader scan', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        collectors = [c for c in self.collectors if not c.ready]
+        try:
+            with self.file.open() as handle:
+                offset = 0
+                rest = b''
+                while not self.stopping.is_set():
+                    data = handle.read(SCAN_CHUNK_SIZE)
+                    if not data:
+                        break
+
+                    data = rest + data
+                    end = data.rfind(b'\n') + 1
+                    if end == 0:
+                        rest = data
+                        continue
+
+                    chunk, rest = data[:end], data[end:]
+                    for collector in collectors:
+                        collector.feed(chunk, offset)
+                    offset += len(chunk)
+
+                if self.stopping.is_set():
+                    return
+
+                if rest:
+                    for collector in collectors:
+                        collector.feed(rest, offset)
+                    offset += len(rest)
+
+            for collector in collectors:
+                collector.finish(offset)
+        except Exception:
+            logging.exception(f'gcode_loader scan {self.file.path}')
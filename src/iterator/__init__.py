@@ -1,9 +1,14 @@
 from __future__ import annotations
+from typing import Callable
+from typing import Collection
 from typing import Optional
 from typing import TYPE_CHECKING
 from .base import GCodeIterator, GCodeFileIterator
 from .comment_filter import CommentFilter
+from .compiled_reader import CompiledFileReader
 from .file_reader import GCodeFileReader
+from .include_cache import IncludeCache
+from .prefetch_iterator import PrefetchIterator
 from .recursive_iterator import RecursiveIterator
 from .string_reader import GCodeStringReader, GCodeMacroReader
 from .with_file_iterator import WithFileIterator
@@ -12,6 +17,8 @@ from .with_virtual_file_iterator import WithVirtualFileIterator
 if TYPE_CHECKING:
     from ..file import GCodeFile
     from ..dispatch import GCodeDispatchHelper
+    from ..index import CompiledIndex
+    from ..index import ObjectIndex
 
 
 def full_gcode_iterator(
@@ -45,6 +52,21 @@ def full_virtual_file_iterator(
 
 def full_file_iterator(
     file: GCodeFile, helper: GCodeDispatchHelper,
-    uninterrupted_macros: Optional[set[str]] = None
+    uninterrupted_macros: Optional[set[str]] = None,
+    prefetch: int = 0,
+    objects: Optional[ObjectIndex] = None,
+    excluded: Optional[Callable[[], Collection[str]]] = None,
+    compiled: Optional[CompiledIndex] = None
 ):
-    return WithFileIterator(file, full_gcode_iterator(GCodeFileReader(file), helper, uninterrupted_macros))
+    if compiled is not None:
+        # compiled index has no comments, filtering is already done
+        reader = CompiledFileReader(file, compiled, objects=objects, excluded=excluded)
+        if prefetch > 0:
+            reader = PrefetchIterator(reader, prefetch, helper.printer.get_reactor())
+        return WithFileIterator(file, RecursiveIterator(reader, helper, uninterrupted_macros=uninterrupted_macros))
+
+    file_reader = GCodeFileReader(file, objects=objects, excluded=excluded)
+    if prefetch > 0:
+        reader = PrefetchIterator(CommentFilter(file_reader), prefetch, helper.printer.get_reactor())
+        return WithFileIterator(file, RecursiveIterator(reader, helper, uninterrupted_macros=uninterrupted_macros))
+    return WithFileIterator(file, full_gcode_iterator(file_reader, helper, uninterrupted_macros))
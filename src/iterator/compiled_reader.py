@@ -0,0 +1,62 @@
+from __future__ import annotations
+from typing import Callable
+from typing import Collection
+from typing import Optional
+from typing import TYPE_CHECKING
+from .file_reader import GCodeFileReader
+from ..index.compiled_index import COMPILED_HEADER
+from ..index.compiled_index import COMPILED_RECORD
+from ..index.compiled_index import UNCOMPILED
+from ..line import GCodeFileLine
+
+if TYPE_CHECKING:
+    from ..file import GCodeFile
+    from ..index import CompiledIndex
+    from ..index import ObjectIndex
+
+GAP_READ_LIMIT = 4096
+
+
+# reads lines listed by the compiled index, comments are never tokenized and long ones never read
+class CompiledFileReader(GCodeFileReader):
+    def __init__(self, file: GCodeFile, compiled: CompiledIndex,
+                 objects: Optional[ObjectIndex] = None, excluded: Optional[Callable[[], Collection[str]]] = None):
+        self.compiled = compiled
+        self._record = COMPILED_HEADER.size
+        self._end = COMPILED_HEADER.size + compiled.count * COMPILED_RECORD.size
+        super().__init__(file, objects=objects, excluded=excluded)
+        self._seek(0)
+
+    # position is kept at the start of the next listed line, so object blocks are entered at their start
+    def _read_line(self) -> Optional[GCodeFileLine]:
+        if self._record >= self._end:
+            return None
+
+        offset = self._pos
+        step, lead, command_id, length, args_start, args_end = \
+            COMPILED_RECORD.unpack_from(self.compiled.mapped, self._record)
+        self._record += COMPILED_RECORD.size
+        self._pos = offset + step
+
+        if command_id == UNCOMPILED:
+            raw = self.handle.readline()
+            self.handle.seek(self._pos)
+            return GCodeFileLine(self.file, offset, raw)
+
+        # short gaps (a newline, a short comment) are read through, longer ones sought over
+        if step <= GAP_READ_LIMIT:
+            raw = self.handle.read(step)[lead:lead + length]
+        else:
+            raw = self.handle.read(lead + length)[lead:]
+            self.handle.seek(self._pos)
+        data = raw.decode('ascii')
+        command = self.compiled.commands[command_id]
+        rawparams = data[len(command):]
+        if rawparams[:1] == ' ':
+            rawparams = rawparams[1:]
+        return GCodeFileLine(self.file, offset, raw, data, (command, rawparams, data[args_start:args_end]))
+
+    def _seek(self, pos: int):
+        index, self._pos = self.compiled.find(pos)
+        self._record = COMPILED_HEADER.size + index * COMPILED_RECORD.size
+        self.handle.seek(self._pos)
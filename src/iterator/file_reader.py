@@ -1,31 +1,98 @@
 from __future__ import annotations
+from collections import deque
+from typing import Callable
+from typing import Collection
+from typing import Optional
 from typing import TYPE_CHECKING
 from .base import GCodeIterator
 from ..line import GCodeFileLine
 
 if TYPE_CHECKING:
     from ..file import GCodeFile
+    from ..index import ObjectIndex
+
+READ_BUFFER_SIZE = 1024 * 1024
 
 
 class GCodeFileReader(GCodeIterator):
-    def __init__(self, file: GCodeFile):
+    objects: Optional[ObjectIndex]
+    excluded: Optional[Callable[[], Collection[str]]]
+
+    def __init__(self, file: GCodeFile, buffer_size: int = READ_BUFFER_SIZE,
+                 objects: Optional[ObjectIndex] = None, excluded: Optional[Callable[[], Collection[str]]] = None):
         self.file = file
-        self.handle = open(file.path, 'r', encoding='utf-8')
-        self.handle.seek(0)
+        self.handle = self._open(buffer_size)
+        self._pos = 0
+        self.objects = objects if excluded is not None else None
+        self.excluded = excluded
+        self._pending: deque[GCodeFileLine] = deque()
+        self._range: Optional[int] = None
+        self._next_start: Optional[int] = None
+
+    def _open(self, buffer_size: int):
+        return self.file.open(buffer_size)
 
     def _check_open(self):
         if self.handle.closed:
             raise RuntimeError('file closed')
 
+    def _find_range(self):
+        self._range = self.objects.find(self._pos)
+        self._update_next_start()
+
+    def _update_next_start(self):
+        ranges = self.objects.ranges
+        self._next_start = ranges[self._range].start if self._range < len(ranges) else float('inf')
+
+    # jumps over excluded object blocks, replaying the state changes made inside of them
+    def _skip_objects(self):
+        ranges = self.objects.ranges
+        excluded = None
+        while self._range < len(ranges) and ranges[self._range].start <= self._pos:
+            object_range = ranges[self._range]
+            self._range += 1
+            if object_range.start != self._pos:
+                continue  # started reading inside of the block, exclude_object handles it
+            if excluded is None:
+                excluded = self.excluded()
+            if object_range.name not in excluded:
+                continue
+            self._pending.extend(GCodeFileLine(self.file, object_range.start, raw) for raw in object_range.restore)
+            self._seek(object_range.end)
+        self._update_next_start()
+
     def __next__(self) -> GCodeFileLine:
         self._check_open()
-        pos = self.handle.tell()
-        line = self.handle.readline(1024 * 8)
-        if line == "":
+        if self._pending:
+            return self._pending.popleft()
+
+        if self.objects is not None:
+            if self._next_start is None:
+                if self.objects.ready:
+                    self._find_range()
+            if self._next_start is not None and self._pos >= self._next_start:
+                self._skip_objects()
+                if self._pending:
+                    return self._pending.popleft()
+
+        line = self._read_line()
+        if line is None:
             raise StopIteration()
+        return line
+
+    def _read_line(self) -> Optional[GCodeFileLine]:
+        line = self.handle.readline()
+        if not line:
+            return None
 
+        pos = self._pos
+        self._pos += len(line)
         return GCodeFileLine(self.file, pos, line)
 
+    def _seek(self, pos: int):
+        self.handle.seek(pos)
+        self._pos = pos
+
     def close(self):
         self.handle.close()
 
@@ -34,8 +101,11 @@ class GCodeFileReader(GCodeIterator):
         if self.handle.closed:
             return 0
 
-        return self.handle.tell()
+        return self._pos
 
     def seek(self, pos: int):
         self._check_open()
-        self.handle.seek(pos)
+        self._seek(pos)
+        self._pending.clear()
+        self._range = None
+        self._next_start = None
@@ -0,0 +1,133 @@
+from __future__ import annotations
+from bisect import bisect_left
+from collections import OrderedDict
+import os
+import sys
+from typing import NamedTuple
+from typing import Optional
+from typing import TYPE_CHECKING
+from .base import GCodeIterator
+from .comment_filter import CommentFilter
+from .file_reader import GCodeFileReader
+from ..line import GCodeFileLine
+
+if TYPE_CHECKING:
+    from ..file import GCodeFile
+
+LINE_TUPLE_COST = sys.getsizeof((None, None, None))
+LIST_SLOT_COST = 8
+
+
+class CachedInclude(NamedTuple):
+    mtime: int
+    size: int
+    offsets: list[int]
+    lines: list[tuple[bytes, str, tuple[Optional[str], str, str]]]  # raw, data, split
+    end: int
+    cost: int
+
+
+# memory a cached line holds: its objects, the tuples keeping them and both list slots
+def line_cost(raw: bytes, data: str, split: tuple[Optional[str], str, str], offset: int) -> int:
+    cost = sys.getsizeof(raw) + sys.getsizeof(data) + sys.getsizeof(split) + LINE_TUPLE_COST + sys.getsizeof(offset)
+    for part in split:
+        if part is not None:
+            cost += sys.getsizeof(part)
+    return cost + 2 * LIST_SLOT_COST
+
+
+# replays tokenized lines of a cached include, every line is a fresh object so nothing leaks between replays
+class CachedFileReader(GCodeIterator):
+    def __init__(self, file: GCodeFile, entry: CachedInclude):
+        self.file = file
+        self.entry = entry
+        self.index = 0
+        self.closed = False
+
+    def __next__(self) -> GCodeFileLine:
+        if self.closed or self.index >= len(self.entry.lines):
+            raise StopIteration()
+        raw, data, split = self.entry.lines[self.index]
+        line = GCodeFileLine(self.file, self.entry.offsets[self.index], raw, data, split)
+        self.index += 1
+        return line
+
+    def close(self):
+        self.closed = True
+
+    @property
+    def pos(self) -> int:
+        if self.index >= len(self.entry.offsets):
+            return self.entry.end
+        return self.entry.offsets[self.index]
+
+    def seek(self, pos: int):
+        self.index = bisect_left(self.entry.offsets, pos)
+
+
+# included files by path, checked against mtime and size on every use, evicted by size of their lines
+class IncludeCache:
+    entries: OrderedDict[str, CachedInclude]
+
+    def __init__(self, size: int):
+        self.size = size
+        self.entries = OrderedDict()
+        self.cost = 0
+        self.hits = 0
+        self.misses = 0
+
+    def open(self, file: GCodeFile) -> GCodeIterator:
+        if self.size == 0:
+            return CommentFilter(GCodeFileReader(file))
+
+        stat = os.stat(file.path)
+        entry = self.entries.get(file.path)
+        if entry is not None and entry.mtime == stat.st_mtime_ns and entry.size == stat.st_size:
+            self.entries.move_to_end(file.path)
+            self.hits += 1
+            return CachedFileReader(file, entry)
+
+        self.misses += 1
+        if entry is not None:
+            self._remove(file.path)
+        if stat.st_size > self.size:
+            return CommentFilter(GCodeFileReader(file))
+
+        entry = self._load(file, stat)
+        if entry is None:
+            return CommentFilter(GCodeFileReader(file))
+
+        self.entries[file.path] = entry
+        self.cost += entry.cost
+        while self.cost > self.size:
+            self._remove(next(iter(self.entries)))
+        return CachedFileReader(file, entry)
+
+    # None as soon as the lines take more memory than the whole cache
+    def _load(self, file: GCodeFile, stat: os.stat_result) -> Optional[CachedInclude]:
+        offsets = []
+        lines = []
+        cost = 0
+        reader = GCodeFileReader(file)
+        try:
+            for line in CommentFilter(reader):
+                split = line._tokenize()
+                offsets.append(line.offset)
+                lines.append((line.raw, line.data, split))
+                cost += line_cost(line.raw, line.data, split, line.offset)
+                if cost > self.size:
+                    return None
+            end = reader.pos
+        finally:
+            reader.close()
+        return CachedInclude(stat.st_mtime_ns, stat.st_size, offsets, lines, end, cost)
+
+    def _remove(self, path: str):
+        self.cost -= self.entries.pop(path).cost
+
+    def clear(self):
+        self.entries.clear()
+        self.cost = 0
+
+    def get_status(self) -> dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.cost}
@@ -0,0 +1,131 @@
+from __future__ import annotations
+import queue
+import threading
+from typing import Any
+from typing import Optional
+from .base import GCodeIterator
+from .base import GCodeProxyIterator
+from ..line import GCodeLine
+
+END = object()
+WAIT_LIMIT = 0.250  # longest single wait for the worker, the queue is checked again after it
+
+
+class PrefetchIterator(GCodeProxyIterator):
+    queue: queue.Queue
+    thread: Optional[threading.Thread]
+    stopping: threading.Event
+    reactor: Optional[Any]
+
+    # with a reactor an empty queue yields to it until the worker catches up, without one it blocks
+    def __init__(self, inner: GCodeIterator, size: int, reactor: Optional[Any] = None):
+        super().__init__(inner)
+        self.queue = queue.Queue(maxsize=size)
+        self.thread = None
+        self.stopping = threading.Event()
+        self.reactor = reactor
+        self._pos = inner.pos
+        self._lock = threading.Lock()
+        self._waiter = None
+
+    def _worker(self, stopping: threading.Event):
+        while not stopping.is_set():
+            try:
+                line = next(self.inner)
+                self._tokenize(line)
+                item = (line, self.inner.pos)
+            except StopIteration:
+                item = (END, None)
+            except Exception as e:
+                item = (e, None)
+
+            while not stopping.is_set():
+                try:
+                    self.queue.put(item, timeout=0.100)
+                    break
+                except queue.Full:
+                    continue
+            self._wake()
+
+            if item[1] is None:
+                return
+
+    @staticmethod
+    def _tokenize(line: GCodeLine):
+        try:
+            _ = line.params
+        except Exception:
+            pass  # malformed parameters raise again when accessed by the dispatcher
+
+    # wakes the reactor side waiting for a line, called from the worker
+    def _wake(self):
+        with self._lock:
+            waiter, self._waiter = self._waiter, None
+        if waiter is not None:
+            self.reactor.register_async_callback(lambda _: waiter.complete(None))
+
+    def _get(self) -> tuple[Any, Optional[int]]:
+        if self.reactor is None:
+            return self.queue.get()
+
+        while True:
+            try:
+                return self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                if not self.queue.empty():
+                    continue
+                waiter = self._waiter = self.reactor.completion()
+            waiter.wait(self.reactor.monotonic() + WAIT_LIMIT)
+
+    def _drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+    def _start(self):
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._worker, args=(self.stopping,), name='gcode_loader prefetch',
+                                       daemon=True)
+        self.thread.start()
+
+    def _stop(self):
+        if self.thread is not None:
+            self.stopping.set()
+            self._drain()  # unblock a pending put
+            self.thread.join()
+            self.thread = None
+
+        self._drain()
+
+    def __next__(self) -> GCodeLine:
+        if self.thread is None:
+            self._start()
+
+        line, pos = self._get()
+        if pos is None:
+            # worker finished, next call restarts it at current inner position
+            self.thread.join()
+            self.thread = None
+            if line is END:
+                raise StopIteration()
+            raise line
+
+        self._pos = pos
+        return line
+
+    @property
+    def pos(self) -> int:
+        return self._pos
+
+    def seek(self, pos: int):
+        self._stop()
+        self.inner.seek(pos)
+        self._pos = self.inner.pos
+
+    def close(self):
+        self._stop()
+        self.inner.close()
@@ -4,7 +4,6 @@ from typing import TYPE_CHECKING
 from gcode import CommandError
 from .comment_filter import CommentFilter
 from .string_reader import GCodeMacroReader
-from .file_reader import GCodeFileReader
 from .base import GCodeIterator
 from .base import GCodeProxyIterator
 from ..line import GCodeLine
@@ -17,6 +16,8 @@ if TYPE_CHECKING:
 class RecursiveIterator(GCodeProxyIterator):
     helper: GCodeDispatchHelper
     nested: list[GCodeIterator]
+    nested_macros: list[Optional[str]]
+    active_macros: dict[str, int]
     uninterrupted_macros: set[str]
 
     def __init__(
@@ -27,56 +28,91 @@ class RecursiveIterator(GCodeProxyIterator):
         super().__init__(inner)
         self.helper = helper
         self.nested = []
+        self.nested_macros = []
+        self.active_macros = {}
         self.uninterrupted_macros = uninterrupted_macros or set()
 
+        top = inner.top()
+        self.root_macro = top.macro if isinstance(top, GCodeMacroReader) else None
+
+    def _push(self, iterator: GCodeIterator, macro: Optional[str] = None):
+        self.nested.append(iterator)
+        self.nested_macros.append(macro)
+        if macro is not None:
+            self.active_macros[macro] = self.active_macros.get(macro, 0) + 1
+
+    def _pop(self):
+        self.nested.pop().close()
+        macro = self.nested_macros.pop()
+        if macro is not None:
+            count = self.active_macros[macro] - 1
+            if count > 0:
+                self.active_macros[macro] = count
+            else:
+                del self.active_macros[macro]
+
+    def _clear(self):
+        for iterator in self.nested:
+            iterator.close()
+        self.nested = []
+        self.nested_macros = []
+        self.active_macros = {}
+
     def _get_next_line(self) -> GCodeLine:
-        while len(self.nested) > 0:
+        while self.nested:
             try:
-                return next(self.nested[0])
+                return next(self.nested[-1])
             except StopIteration:
-                self.nested.pop(0)
+                self._pop()
                 continue
 
         return next(self.inner)
 
     def __next__(self):
+        telemetry = self.helper.telemetry
+        if not telemetry.enabled:
+            return self._next_line()
+
+        start = telemetry.clock()
+        try:
+            return self._next_line()
+        finally:
+            telemetry.record_read(telemetry.clock() - start)
+
+    def _next_line(self) -> GCodeLine:
         while True:
             line = self._get_next_line()
-            if line.cmd == 'SDCARD_PRINT_FILE' and int(line.params.get('INCLUDE', 0)) > 0:
+            command = self.helper.commands.lookup(line.cmd)
+            if command.include and int(line.params.get('INCLUDE', 0)) > 0:
                 filename = line.params['FILENAME']
                 try:
-                    self.nested.insert(0, CommentFilter(GCodeFileReader(self.helper.locator.load_file(filename, check_subdirs=True))))
+                    self._push(self.helper.include_cache.open(self.helper.locator.load_file(filename, check_subdirs=True)))
                 except (CommandError, FileNotFoundError) as e:
                     raise CommandLineError(line, e)
-            elif self.helper.has_macro(line.cmd):
+            elif command.macro is not None:
                 if self._check_recursive_call(line.cmd):
                     raise CommandLineError(line, f"Macro {line.cmd} called recursively")
-                macro = self.helper.get_macro(line.cmd)
+                macro = command.macro
+                profiler = self.helper.profiler
+                start = profiler.clock() if profiler.enabled else None
                 try:
                     content = macro.render(line.params, line.rawparams)
                 except CommandError as e:
                     raise CommandLineError(line, e)
-                else:
-                    self.nested.insert(0, CommentFilter(GCodeMacroReader(line.cmd, content, line)))
+                finally:
+                    if start is not None:
+                        profiler.record_render(profiler.resolve(line, line.cmd), profiler.clock() - start)
+                self._push(CommentFilter(GCodeMacroReader(line.cmd, content, line)), line.cmd)
             else:
                 return line
 
     def seek(self, pos: int):
         super().seek(pos)
-        self.nested = []
+        self._clear()
 
     def close(self):
         super().close()
-        self.nested = []
+        self._clear()
 
     def _check_recursive_call(self, macro: str) -> bool:
-        top = self.top()
-        if isinstance(top, GCodeMacroReader) and top.macro == macro:
-            return True
-
-        for it in self.nested:
-            top = it.top()
-            if isinstance(top, GCodeMacroReader) and top.macro == macro:
-                return True
-
-        return False
+        return macro == self.root_macro or macro in self.active_macros
@@ -10,33 +10,39 @@ from ..line import GCodeLine, CompiledGcodeLine
 class BaseGCodeStringReader(GCodeIterator):
     def __init__(self, data: str):
         self.data = data
-        self.lines = data.split('\n')
         self.no = 0
+        self.closed = False
         self._pos = 0
 
     def __next__(self) -> GCodeLine:
-        try:
-            line = self.lines.pop(0)
-            self.no += 1
-            gcode_line = self._create_line(line)
-            self._pos += 1 + len(line)
-            return gcode_line
-        except IndexError:
+        pos = self._pos
+        if self.closed or pos > len(self.data):
             raise StopIteration()
 
+        end = self.data.find('\n', pos)
+        if end < 0:
+            end = len(self.data)
+
+        self.no += 1
+        gcode_line = self._create_line(self.data[pos:end])
+        self._pos = end + 1
+        return gcode_line
+
     @abstractmethod
     def _create_line(self, line: str) -> GCodeLine:
         pass
 
     def close(self):
-        self.lines = []
+        self.closed = True
 
     @property
     def pos(self):
         return self._pos
 
     def seek(self, pos: int):
-        pass  # todo
+        pos = max(0, pos)
+        self.no = self.data.count('\n', 0, pos)
+        self._pos = pos
 
 
 class GCodeStringReader(BaseGCodeStringReader):
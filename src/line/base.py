@@ -1,18 +1,27 @@
 from __future__ import annotations
-from functools import cached_property
-import re
-import shlex
 from typing import Optional
 import copy
 from ..macro.utils import is_classic_gcode
-
-CLASSIC_SPLIT_REGEX = re.compile('([A-Z*/])')
+from .tokenizer import parse_params
+from .tokenizer import tokenize
 
 
 class GCodeLine:
+    __slots__ = ('_data', '_split', '_params')
+
     def __init__(self, data: str):
         self.data = data.strip()
 
+    @property
+    def data(self) -> str:
+        return self._data
+
+    @data.setter
+    def data(self, data: str):
+        self._data = data
+        self._split = None
+        self._params = None
+
     def copy(self, data: Optional[str] = None):
         copied = copy.copy(self)
 
@@ -27,61 +36,32 @@ class GCodeLine:
     def __str__(self):
         return self.__repr__()
 
-    @cached_property
-    def _split(self):
-        line = self.data
-        cpos = line.find(';')
-        if cpos >= 0:
-            line = line[:cpos]
+    def _tokenize(self):
+        if self._split is None:
+            self._split = tokenize(self.data)
+        return self._split
 
-        split = line.strip().split(' ', maxsplit=1)
-        if len(split) == 2:
-            return (split[0].upper(), split[1].lstrip())
-        return (split[0].upper(), '')
-
-    @cached_property
+    @property
     def cmd(self) -> Optional[str]:
-        command, _ = self._split
-        if len(command) == 0:
-            return None
-
-        return command
+        return self._tokenize()[0]
 
-    @cached_property
+    @property
     def is_classic(self) -> bool:
-        if self.cmd is None:
+        command = self._tokenize()[0]
+        if command is None:
             return False
 
-        return is_classic_gcode(self.cmd)
-
-    @cached_property
-    def params(self):
-        _, rawparams = self._split
-        if len(rawparams) == 0:
-            return {}
-
-        mapper = lambda s: s.split('=', maxsplit=1)
-        if self.is_classic:
-            mapper = lambda s: [s[0], s[1:]]
-
-        return {s[0].upper(): s[1] for s in map(mapper, shlex.split(rawparams))}
-
-    @cached_property
-    def rawparams(self):
-        command = self.cmd or ''
-        if command in ('M117', 'M118'):
-            command = command[:4]
-        rawparams = self.data
-        urawparams = rawparams.upper()
-        if not urawparams.startswith(command):
-            rawparams = rawparams[urawparams.find(command):]
-            end = rawparams.rfind('*')
-            if end >= 0:
-                rawparams = rawparams[:end]
-        rawparams = rawparams[len(command):]
-        if rawparams.startswith(' '):
-            rawparams = rawparams[1:]
-        return rawparams
+        return is_classic_gcode(command)
+
+    @property
+    def params(self) -> dict[str, str]:
+        if self._params is None:
+            self._params = parse_params(self._tokenize()[2], self.is_classic)
+        return self._params
+
+    @property
+    def rawparams(self) -> str:
+        return self._tokenize()[1]
 
 
 if __name__ == '__main__':
@@ -4,6 +4,8 @@ from .base import GCodeLine
 
 
 class CompiledGcodeLine(GCodeLine):
+    __slots__ = ('macro', 'line', 'parent')
+
     def __init__(self, macro: str, line: int, data: str, parent: Optional[GCodeLine] = None):
         super().__init__(data)
         self.macro = macro
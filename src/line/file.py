@@ -1,4 +1,5 @@
 from __future__ import annotations
+from typing import Optional
 from typing import TYPE_CHECKING
 
 from .base import GCodeLine
@@ -8,10 +9,24 @@ if TYPE_CHECKING:
 
 
 class GCodeFileLine(GCodeLine):
-    def __init__(self, file: GCodeFile, offset: int, data: str):
-        super().__init__(data)
+    __slots__ = ('file', 'offset', 'raw')
+
+    # data and split can be given when the line was already tokenized, like by the compiled index
+    def __init__(self, file: GCodeFile, offset: int, raw: bytes,
+                 data: Optional[str] = None, split: Optional[tuple[Optional[str], str, str]] = None):
+        self._data = data
+        self._split = split
+        self._params = None
         self.file = file
         self.offset = offset
+        self.raw = raw
+
+    @GCodeLine.data.getter
+    def data(self) -> str:
+        # raw bytes are decoded only once the line is actually parsed
+        if self._data is None:
+            self._data = self.raw.decode('utf-8').strip()
+        return self._data
 
     def __repr__(self):
         return f'  - {self.offset}: {self.data}'
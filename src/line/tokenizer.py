@@ -0,0 +1,68 @@
+from __future__ import annotations
+import re
+import shlex
+from typing import Optional
+
+# characters that make shlex behave differently from a plain whitespace split
+SHLEX_SPECIAL_REGEX = re.compile('[\'"\\\\]')
+# shlex whitespace set, str.split() would also split on other unicode spaces
+TOKEN_REGEX = re.compile('[^ \t\r\n]+')
+
+
+# splits stripped line into (command, rawparams, params source), rawparams keep the trailing comment
+def tokenize(data: str) -> tuple[Optional[str], str, str]:
+    cpos = data.find(';')
+    line = data if cpos < 0 else data[:cpos].rstrip()
+
+    spos = line.find(' ')
+    if spos < 0:
+        command = line.upper()
+        args = ''
+    else:
+        command = line[:spos].upper()
+        args = line[spos + 1:].lstrip()
+
+    if len(command) == 0:
+        return None, data, args
+
+    rawparams = data[len(command):]
+    if rawparams.startswith(' '):
+        rawparams = rawparams[1:]
+
+    return command, rawparams, args
+
+
+# command and the span of params source within stripped line, None for comments, matches tokenize
+def tokenize_spans(data: str) -> Optional[tuple[str, int, int]]:
+    cpos = data.find(';')
+    line = data if cpos < 0 else data[:cpos].rstrip()
+
+    spos = line.find(' ')
+    if spos < 0:
+        command = line.upper()
+        start = len(line)
+    else:
+        command = line[:spos].upper()
+        start = len(line) - len(line[spos + 1:].lstrip())
+
+    if len(command) == 0:
+        return None
+
+    return command, start, len(line)
+
+
+def split_params(args: str) -> list[str]:
+    if SHLEX_SPECIAL_REGEX.search(args) is None:
+        return TOKEN_REGEX.findall(args)
+
+    return shlex.split(args)
+
+
+def parse_params(args: str, classic: bool) -> dict[str, str]:
+    if len(args) == 0:
+        return {}
+
+    if classic:
+        return {s[0].upper(): s[1:] for s in split_params(args)}
+
+    return {s[0].upper(): s[1] for s in map(lambda s: s.split('=', maxsplit=1), split_params(args))}
@@ -1,36 +1,107 @@
 from __future__ import annotations
 from typing import Iterable
+from typing import NamedTuple
 import os
+from .compression import compression_of
+from .compression import is_gcode_name
 from .file import GCodeFile
-from ..virtual_sdcard import VALID_GCODE_EXTS
+
+
+class DirectoryEntry(NamedTuple):
+    mtime: int
+    files: list[GCodeFile]
+    dirs: list[str]
+
+
+class FileListing(NamedTuple):
+    dirs: dict[str, DirectoryEntry]
+    files: list[GCodeFile]
+    names: dict[str, GCodeFile]
+    folded_names: dict[str, GCodeFile]
+
+    def is_current(self, dirs: dict[str, DirectoryEntry]) -> bool:
+        return self.dirs.keys() == dirs.keys() and all(self.dirs[path] is entry for path, entry in dirs.items())
 
 
 class GCodeLocator:
     def __init__(self, basedir: str):
         self.basedir = basedir
+        self._dirs: dict[str, DirectoryEntry] = {}
+        self._listings: dict[bool, FileListing] = {}
 
-    def get_file_list(self, check_subdirs: bool = False) -> Iterable[GCodeFile]:
-        if check_subdirs:
-            flist = []
-            for root, dirs, files in os.walk(self.basedir, followlinks=True):
-                base = os.path.relpath(root, self.basedir)
-                for name in files:
-                    if name[name.rfind('.') + 1:] not in VALID_GCODE_EXTS:
-                        continue
-
-                    flist.append(GCodeFile(self.basedir, os.path.join(base, name).lstrip('.\\/')))
-            return sorted(flist, key=lambda f: f.name.lower())
-        else:
-            flist = []
-            for name in sorted(os.listdir(self.basedir), key=str.lower):
-                if name.startswith('.'):
+    def _scan_directory(self, path: str, mtime: int) -> DirectoryEntry:
+        files = []
+        dirs = []
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    dirs.append(entry.name)
                     continue
-                if name[name.rfind('.') + 1:] not in VALID_GCODE_EXTS:
+                if not is_gcode_name(entry.name):
                     continue
-                if not os.path.isfile((os.path.join(self.basedir, name))):
+                if not entry.is_file():
                     continue
-                flist.append(GCodeFile(self.basedir, name))
-            return flist
+                name = os.path.relpath(entry.path, self.basedir)
+                stat = entry.stat()
+                # compressed files report uncompressed size, read lazily from their trailer or headers
+                size = stat.st_size if compression_of(entry.name) is None else None
+                files.append(GCodeFile(self.basedir, name, size=size, mtime=stat.st_mtime_ns))
+        return DirectoryEntry(mtime, files, dirs)
+
+    # directory mtime changes whenever an entry is added, removed or renamed, only then it's rescanned
+    def _directory(self, path: str) -> DirectoryEntry:
+        mtime = os.stat(path).st_mtime_ns
+        entry = self._dirs.get(path)
+        if entry is None or entry.mtime != mtime:
+            entry = self._scan_directory(path, mtime)
+            self._dirs[path] = entry
+        return entry
+
+    def _walk(self) -> dict[str, DirectoryEntry]:
+        dirs = {}
+        pending = [self.basedir]
+        while pending:
+            path = pending.pop()
+            entry = self._directory(path)
+            dirs[path] = entry
+            pending.extend(os.path.join(path, name) for name in entry.dirs)
+
+        for path in self._dirs.keys() - dirs.keys():
+            del self._dirs[path]
+        return dirs
+
+    def _listing(self, check_subdirs: bool) -> FileListing:
+        if check_subdirs:
+            dirs = self._walk()
+        else:
+            dirs = {self.basedir: self._directory(self.basedir)}
+
+        listing = self._listings.get(check_subdirs)
+        if listing is not None and listing.is_current(dirs):
+            return listing
+
+        if check_subdirs:
+            files = [f for entry in dirs.values() for f in entry.files]
+        else:
+            files = [f for f in dirs[self.basedir].files if not f.name.startswith('.')]
+        files.sort(key=lambda f: f.name.lower())
+
+        names = {}
+        folded_names = {}
+        for file in files:
+            names.setdefault(file.name, file)
+            folded_names.setdefault(file.name.lower(), file)
+
+        listing = FileListing(dirs, files, names, folded_names)
+        self._listings[check_subdirs] = listing
+        return listing
+
+    # files rewritten in place keep their directory's mtime, reported ones are checked on their own
+    def get_file_list(self, check_subdirs: bool = False) -> Iterable[GCodeFile]:
+        files = self._listing(check_subdirs).files
+        for file in files:
+            file.refresh()
+        return files
 
     def load_file(self, filename: str, check_subdirs: bool = False) -> GCodeFile:
         filename = filename.strip().lstrip('.\\/')
@@ -39,14 +110,9 @@ class GCodeLocator:
             if os.path.exists(os.path.join(self.basedir, filename)):
                 return GCodeFile(self.basedir, filename)
 
-        files = self.get_file_list(check_subdirs)
-        for file in files:
-            if file.name == filename:
-                return file
-
-        filename = filename.lower()
-        for file in files:
-            if file.name.lower() == filename:
-                return file
+        listing = self._listing(check_subdirs)
+        file = listing.names.get(filename) or listing.folded_names.get(filename.lower())
+        if file is not None:
+            return GCodeFile(self.basedir, file.name)
 
-        raise FileNotFoundError(f'File: \'{filename}\' not found')
+        raise FileNotFoundError(f'File: \'{filename.lower()}\' not found')
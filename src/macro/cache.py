@@ -0,0 +1,34 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Hashable
+from typing import Optional
+
+
+class RenderCache:
+    entries: OrderedDict[Hashable, str]
+
+    def __init__(self, size: int):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[str]:
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: str):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
@@ -6,6 +6,8 @@ from jinja2.exceptions import TemplateError
 from configfile import ConfigWrapper
 from configfile import error as ConfigError
 from gcode import CommandError
+from .cache import RenderCache
+from .template import MacroTemplate
 from .utils import is_classic_gcode
 from .utils import load_variables
 from .utils import parse_value
@@ -14,7 +16,6 @@ from ..interfaces.macro import MacroInterface
 if TYPE_CHECKING:
     from gcode import GCodeCommand
     from ..dispatch import GCodeDispatchHelper
-    from .template import MacroTemplate
     from .printer_macro import PrinterMacro
 
 
@@ -33,8 +34,12 @@ class Macro(MacroInterface):
     cmd_desc: str
     variables: dict[str, Any]
     in_script: bool
+    render_cache: RenderCache
 
-    def __init__(self, helper: GCodeDispatchHelper, config: ConfigWrapper, printer_macro: PrinterMacro):
+    def __init__(
+        self, helper: GCodeDispatchHelper, config: ConfigWrapper, printer_macro: PrinterMacro,
+        template: Optional[MacroTemplate] = None
+    ):
         name: str = config.get_name().split(maxsplit=1)[1]
         if ' ' in name:
             raise ConfigError(f"Name of section '{name}' contains illegal whitespace")
@@ -42,16 +47,30 @@ class Macro(MacroInterface):
         self.helper = helper
         self.name = name
         self.alias = name.upper()
-        self.template = printer_macro.load_template(config, 'gcode', name=self.alias)
+        self.template = template or printer_macro.load_template(
+            config, 'gcode', name=self.alias, lazy=printer_macro.lazy
+        )
         self.rename_existing = config.get("rename_existing", None)
         self.cmd_desc = config.get("description", "G-Code macro")
         self.variables = load_variables(config)
         self.in_script = False
+        self.render_cache = RenderCache(helper.render_cache_size)
 
         if self.rename_existing is not None and is_classic_gcode(self.alias) != is_classic_gcode(self.rename_existing):
             raise ConfigError(f"G-Code macro rename of different types ('{self.alias}' vs '{self.rename_existing}')")
 
     def render(self, params: dict, rawparams: str) -> str:
+        if not self.template.pure or self.render_cache.size == 0:
+            return self._render(params, rawparams)
+
+        key = (rawparams, tuple(params.items()))
+        content = self.render_cache.get(key)
+        if content is None:
+            content = self._render(params, rawparams)
+            self.render_cache.put(key, content)
+        return content
+
+    def _render(self, params: dict, rawparams: str) -> str:
         kwparams = dict(self.variables)
         kwparams.update(self.helper.create_template_context())
         kwparams['params'] = params
@@ -61,7 +80,16 @@ class Macro(MacroInterface):
     def execute(self, params: dict, rawparams: str):
         self.in_script = True
         try:
-            self.helper.run_script_from_command(self.render(params, rawparams), name=self.alias)
+            profiler = self.helper.profiler
+            if profiler.enabled:
+                start = profiler.clock()
+                try:
+                    content = self.render(params, rawparams)
+                finally:
+                    profiler.record_render(profiler.resolve(None, self.alias), profiler.clock() - start)
+            else:
+                content = self.render(params, rawparams)
+            self.helper.run_script_from_command(content, name=self.alias)
         finally:
             self.in_script = False
 
@@ -69,6 +97,7 @@ class Macro(MacroInterface):
         v = dict(self.variables)
         v[name] = value
         self.variables = v
+        self.render_cache.clear()
 
     def cmd(self, gcmd: GCodeCommand):
         if self.in_script:
@@ -86,7 +115,10 @@ class Macro(MacroInterface):
         except (SyntaxError, TypeError, ValueError) as e:
             raise CommandError(f"Unable to parse '{value}' as a literal: {e}")
 
-    def update_config(self, macro_config: ConfigWrapper, vars_mode: VariableMode, verbose: bool = False) -> bool:
+    def update_config(
+        self, macro_config: ConfigWrapper, vars_mode: VariableMode, verbose: bool = False,
+        template: Optional[MacroTemplate] = None
+    ) -> bool:
         rename_existing: Optional[str] = macro_config.get("rename_existing", None)
         if self.rename_existing is None and rename_existing is not None:
             # this shouldn't happen
@@ -101,14 +133,17 @@ class Macro(MacroInterface):
             return False
 
         try:
-            new_template = self.helper.gcode_macro.load_template(macro_config, 'gcode')
+            # compare sources first, only changed templates are compiled
+            new_template = template
+            if new_template is None and MacroTemplate.hash_source(macro_config.get('gcode')) != self.template.hash:
+                new_template = self.helper.gcode_macro.load_template(macro_config, 'gcode')
         except (TemplateError, ConfigError) as e:
             if verbose:
                 self.helper.respond_info(f'Skipped {self.alias} - template error: {e}')
             return False
 
         changed_code = False
-        if new_template.hash != self.template.hash:
+        if new_template is not None:
             self.template = new_template
             changed_code = True
 
@@ -139,6 +174,8 @@ class Macro(MacroInterface):
             changed_desc = True
 
         updated = changed_code or changed_vars or changed_orig or changed_desc
+        if changed_code or changed_vars:
+            self.render_cache.clear()
 
         if updated and verbose:
             changes = ", ".join(filter(lambda s: s is not None, [
@@ -16,11 +16,14 @@ if TYPE_CHECKING:
 
 
 class PrinterMacro(PrinterGCodeMacroInterface):
-    def __init__(self, helper: GCodeDispatchHelper):
+    # lazy applies to gcode_macro sections only, templates of other modules still fail at startup
+    def __init__(self, helper: GCodeDispatchHelper, lazy: bool = False):
         self.helper = helper
+        self.lazy = lazy
         self.jinja = jinja2.Environment('{%', '%}', '{', '}')
 
-    def load_template(self, config, option, default: Optional[Any] = None, name: Optional[str] = None) -> MacroTemplate:
+    def load_template(self, config, option, default: Optional[Any] = None, name: Optional[str] = None,
+                      lazy: bool = False) -> MacroTemplate:
         full_name = "%s:%s" % (config.get_name(), option)
         if name is None:
             name = full_name
@@ -31,7 +34,7 @@ class PrinterMacro(PrinterGCodeMacroInterface):
             script = config.get(option, default)
 
         try:
-            return MacroTemplate(self.helper, script, name=name)
+            return MacroTemplate(self.helper, script, name=name, lazy=lazy)
         except Exception as e:
             msg = "Error loading template '%s': %s" % (full_name, traceback.format_exception_only(type(e), e)[-1])
             logging.exception(msg)
@@ -0,0 +1,50 @@
+from __future__ import annotations
+from typing import NamedTuple
+from typing import Optional
+from typing import TYPE_CHECKING
+from jinja2.exceptions import TemplateError
+from configfile import error as ConfigError
+from .template import MacroTemplate
+from ..mock.printer_config import ConfigFiles
+from ..mock.printer_config import PrinterConfig
+
+if TYPE_CHECKING:
+    from configfile import ConfigWrapper
+    from ..dispatch import GCodeDispatchHelper
+
+
+class PreparedMacro(NamedTuple):
+    config: ConfigWrapper
+    template: Optional[MacroTemplate]
+    error: Optional[str]
+
+
+class PreparedReload(NamedTuple):
+    files: ConfigFiles
+    macros: dict[str, PreparedMacro]
+
+
+# reads config and compiles changed templates without touching live macros, safe to run off the reactor,
+# compiled even with lazy_macros so errors are reported by the reload
+def prepare_reload(helper: GCodeDispatchHelper, name_filter: Optional[str] = None) -> PreparedReload:
+    printer_config = PrinterConfig(helper.printer)
+    config = printer_config.read_main_config()
+
+    macros = {}
+    for macro_config in config.get_prefix_sections('gcode_macro '):
+        name = macro_config.get_name().split()[1].upper()
+        if name_filter is not None and name != name_filter:
+            continue
+
+        template = None
+        error = None
+        try:
+            if not helper.has_macro(name):
+                template = helper.gcode_macro.load_template(macro_config, 'gcode', name=name)
+            elif MacroTemplate.hash_source(macro_config.get('gcode')) != helper.get_macro(name).template.hash:
+                template = helper.gcode_macro.load_template(macro_config, 'gcode')
+        except (TemplateError, ConfigError) as e:
+            error = str(e)
+        macros[name] = PreparedMacro(macro_config, template, error)
+
+    return PreparedReload(printer_config.files, macros)
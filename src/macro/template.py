@@ -1,9 +1,13 @@
 from __future__ import annotations
 import hashlib
 import jinja2
+from jinja2 import meta
+from jinja2 import nodes
 import logging
+import threading
 import traceback
 from typing import Any
+from typing import Iterable
 from typing import Optional
 from typing import Union
 from typing import TYPE_CHECKING
@@ -14,17 +18,93 @@ from ..interfaces.macro import RequiredMacroContextKeys
 if TYPE_CHECKING:
     from ..dispatch import GCodeDispatchHelper
 
+IMPURE_NAMES = {'printer'}
+IMPURE_GLOBALS = {'lipsum'}
+IMPURE_FILTERS = {'random'}
+
+
+# pure template output depends only on its variables, params and rawparams
+def is_pure_template(ast: nodes.Template) -> bool:
+    for name in meta.find_undeclared_variables(ast):
+        if name in IMPURE_NAMES or name.startswith('action_'):
+            return False
+
+    for node in ast.find_all(nodes.Name):
+        if node.name in IMPURE_GLOBALS:
+            return False
+
+    for node in ast.find_all(nodes.Filter):
+        if node.name in IMPURE_FILTERS:
+            return False
+
+    return True
+
+
+# compiles templates, returns (name, error) of those failing
+def validate_templates(templates: Iterable[MacroTemplate]) -> list[tuple[str, str]]:
+    errors = []
+    for template in templates:
+        error = template.validate()
+        if error is not None:
+            errors.append((template.name, error))
+    return errors
+
 
 class MacroTemplate(MacroTemplateInterface):
+    error: Optional[str]
+    _template: Optional[jinja2.Template]
+
     @classmethod
     def hash_source(cls, value: str):
         return hashlib.sha256(value.encode('utf-8')).hexdigest()
 
-    def __init__(self, helper: GCodeDispatchHelper, template: str, name: str):
+    # lazy templates are compiled on first use or validation, syntax errors surface there instead of at load
+    def __init__(self, helper: GCodeDispatchHelper, template: str, name: str, lazy: bool = False):
         self.name = name
         self.helper = helper
+        self.source = template
         self.hash = MacroTemplate.hash_source(template)
-        self.template: jinja2.Template = helper.gcode_macro.jinja.from_string(template)
+        self.error = None
+        self._template = None
+        self._pure = False
+        self._lock = threading.Lock()
+        if not lazy:
+            self._compile()
+
+    # _template is set last, once it is there the template is complete
+    def _compile(self):
+        jinja = self.helper.gcode_macro.jinja
+        ast = jinja.parse(self.source)
+        self._pure = is_pure_template(ast)
+        self._template = jinja.from_string(ast)
+
+    # compiles if not done yet, returns the compilation error, safe to call off the reactor, the first render
+    # and a validation thread may race to compile, the loser waits for the winner's result
+    def validate(self) -> Optional[str]:
+        if self._template is not None:
+            return None
+        with self._lock:
+            if self._template is None and self.error is None:
+                try:
+                    self._compile()
+                except Exception as e:
+                    self.error = traceback.format_exception_only(type(e), e)[-1].strip()
+        return self.error
+
+    @property
+    def compiled(self) -> bool:
+        return self._template is not None
+
+    @property
+    def template(self) -> jinja2.Template:
+        if self.validate() is not None:
+            raise CommandError(f"Error loading template '{self.name}': {self.error}")
+        return self._template
+
+    @property
+    def pure(self) -> bool:
+        _ = self.template
+        return self._pure
 
     def render(self, context: Optional[dict] = None) -> str:
         if context is None:
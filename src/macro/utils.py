@@ -1,5 +1,6 @@
 from __future__ import annotations
 import ast
+from functools import lru_cache
 import json
 from typing import Any
 from configfile import ConfigWrapper
@@ -24,10 +25,11 @@ def load_variables(config: ConfigWrapper) -> dict[str, Any]:
     return variables
 
 
+@lru_cache(maxsize=1024)
 def is_classic_gcode(cmd: str) -> bool:
+    cmd = cmd.upper()
     try:
-        cmd = cmd.upper()
         _ = float(cmd[1:])
-        return cmd[0].isupper() and cmd[1].isdigit()
-    except:
+    except ValueError:
         return False
+    return cmd[0].isupper() and cmd[1].isdigit()
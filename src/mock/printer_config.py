@@ -1,9 +1,91 @@
 from __future__ import annotations
+import hashlib
+import os
+from typing import NamedTuple
+from typing import Optional
 import configfile
 from .printer import Printer
 
 
+class ConfigFileSignature(NamedTuple):
+    mtime: int
+    size: int
+    hash: str
+
+    @classmethod
+    def hash_source(cls, data: str) -> str:
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def read(cls, filename: str, data: Optional[str] = None) -> Optional[ConfigFileSignature]:
+        try:
+            stat = os.stat(filename)
+            if data is None:
+                with open(filename, 'r') as f:
+                    data = f.read().replace('\r\n', '\n')
+        except OSError:
+            return None
+        return cls(stat.st_mtime_ns, stat.st_size, cls.hash_source(data))
+
+    def changed(self, filename: str) -> bool:
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return True
+        if stat.st_mtime_ns == self.mtime and stat.st_size == self.size:
+            return False
+
+        current = ConfigFileSignature.read(filename)
+        return current is None or current.hash != self.hash
+
+
+class ConfigFiles:
+    files: dict[str, ConfigFileSignature]
+    dirs: dict[str, int]
+
+    def __init__(self):
+        self.files = {}
+        self.dirs = {}
+
+    def record(self, filename: str, data: str):
+        signature = ConfigFileSignature.read(filename, data)
+        if signature is not None:
+            self.files[filename] = signature
+
+        dirname = os.path.dirname(os.path.abspath(filename))
+        try:
+            # new files matching include globs only show up as a directory change
+            self.dirs[dirname] = os.stat(dirname).st_mtime_ns
+        except OSError:
+            pass
+
+    def changed(self) -> bool:
+        if not self.files:
+            return True
+
+        for dirname, mtime in self.dirs.items():
+            try:
+                if os.stat(dirname).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+
+        for filename, signature in self.files.items():
+            if signature.changed(filename):
+                return True
+
+        return False
+
+
 class PrinterConfig(configfile.PrinterConfig):
+    files: ConfigFiles
+
     def __init__(self, printer):
         super().__init__(Printer())
         self.printer = printer
+        self.files = ConfigFiles()
+
+    def _read_config_file(self, filename):
+        data = super()._read_config_file(filename)
+        self.files.record(filename, data)
+        return data
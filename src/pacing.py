@@ -0,0 +1,80 @@
+from __future__ import annotations
+from typing import Any
+from typing import Optional
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from klippy import Printer
+
+PACING_MODES = {'fixed': 'fixed', 'adaptive': 'adaptive'}
+MUTEX_BACKOFF = 0.100  # wait for another request holding the gcode mutex
+MIN_BACKOFF = 0.010
+HOLD_LIMIT = 0.250  # longest single wait while the buffer drains, pause requests are checked in between
+
+
+# keeps toolhead buffered print time within [min_buffer, max_buffer], below the point where the toolhead
+# itself would stall the print while holding the gcode mutex
+class Pacer:
+    toolhead: Optional[Any]
+
+    def __init__(self, printer: Printer, mode: str = 'fixed', min_buffer: float = 1.0, max_buffer: float = 1.8):
+        self.printer = printer
+        self.mode = mode
+        self.min_buffer = min_buffer
+        self.max_buffer = max_buffer
+        self.toolhead = None
+        self.state = mode if mode == 'fixed' else 'fill'
+        self.buffer_time = 0.
+        self.holds = 0
+        self.hold_time = 0.
+
+    def _buffer_time(self, eventtime: float) -> Optional[float]:
+        if self.toolhead is None:
+            self.toolhead = self.printer.lookup_object('toolhead', None)
+            if self.toolhead is None:
+                return None
+        print_time, est_print_time, _ = self.toolhead.check_busy(eventtime)
+        return max(0., print_time - est_print_time)
+
+    # delay before the next batch, 0 to dispatch now
+    def update(self, eventtime: float) -> float:
+        if self.mode == 'fixed':
+            return 0.
+
+        buffer_time = self._buffer_time(eventtime)
+        if buffer_time is None:
+            self.state = 'fixed'
+            return 0.
+        self.buffer_time = buffer_time
+
+        # once full, hold until drained to the middle of the window
+        target = (self.min_buffer + self.max_buffer) / 2
+        if buffer_time >= self.max_buffer or (self.state == 'hold' and buffer_time > target):
+            if self.state != 'hold':
+                self.state = 'hold'
+                self.holds += 1
+            delay = min(buffer_time - target, HOLD_LIMIT)
+            self.hold_time += delay
+            return delay
+
+        self.state = 'fill' if buffer_time < self.min_buffer else 'steady'
+        return 0.
+
+    # while the mutex is taken: poll soon when the buffer runs low, otherwise let it drain towards min_buffer
+    def mutex_backoff(self) -> float:
+        if self.state == 'fixed':
+            return MUTEX_BACKOFF
+        if self.state == 'fill':
+            return MIN_BACKOFF
+        return min(MUTEX_BACKOFF, max(MIN_BACKOFF, self.buffer_time - self.min_buffer))
+
+    def get_status(self) -> dict[str, Any]:
+        return {
+            'mode': self.mode,
+            'state': self.state,
+            'buffer_time': round(self.buffer_time, 3),
+            'min_buffer': self.min_buffer,
+            'max_buffer': self.max_buffer,
+            'holds': self.holds,
+            'hold_time': round(self.hold_time, 3),
+        }
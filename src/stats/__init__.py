@@ -0,0 +1,2 @@
+from .profiler import MacroProfiler, ProfileNode, macro_path
+from .telemetry import CommandStats, Telemetry
@@ -0,0 +1,131 @@
+from __future__ import annotations
+import time
+from typing import Optional
+from typing import TYPE_CHECKING
+from ..line import CompiledGcodeLine
+
+if TYPE_CHECKING:
+    from ..line import GCodeLine
+
+
+# names of macros that expanded into given line, outermost first
+def macro_path(line: Optional[GCodeLine]) -> tuple[str, ...]:
+    path = []
+    while isinstance(line, CompiledGcodeLine):
+        path.append(line.macro)
+        line = line.parent
+    path.reverse()
+    return tuple(path)
+
+
+class ProfileNode:
+    __slots__ = ('name', 'calls', 'render', 'lines', 'dispatch', 'children')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.render = 0.
+        self.lines = 0
+        self.dispatch = 0.  # exclusive of nested macros and their rendering
+        self.children: dict[str, ProfileNode] = {}
+
+    def child(self, name: str) -> ProfileNode:
+        node = self.children.get(name)
+        if node is None:
+            node = self.children[name] = ProfileNode(name)
+        return node
+
+    def inclusive(self) -> tuple[float, int, float]:
+        render, lines, dispatch = self.render, self.lines, self.dispatch
+        for child in self.children.values():
+            child_render, child_lines, child_dispatch = child.inclusive()
+            render += child_render
+            lines += child_lines
+            dispatch += child_dispatch
+        return render, lines, dispatch
+
+
+class DispatchFrame:
+    __slots__ = ('path', 'counted', 'nested')
+
+    def __init__(self, path: tuple[str, ...], counted: bool):
+        self.path = path
+        self.counted = counted
+        self.nested = 0.
+
+
+class MacroProfiler:
+    enabled: bool
+    root: ProfileNode
+    stack: list[DispatchFrame]
+
+    def __init__(self):
+        self.enabled = False
+        self.clock = time.perf_counter
+        self.reset()
+
+    def reset(self):
+        self.root = ProfileNode('')
+        self.stack = []
+
+    def start(self):
+        self.reset()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+        self.stack = []
+
+    def _node(self, path: tuple[str, ...]) -> ProfileNode:
+        node = self.root
+        for name in path:
+            node = node.child(name)
+        return node
+
+    # macros run from a command handler are nested under the line being dispatched
+    def _prefix(self) -> tuple[str, ...]:
+        return self.stack[-1].path if self.stack else ()
+
+    def resolve(self, line: Optional[GCodeLine], macro: Optional[str] = None) -> tuple[str, ...]:
+        path = self._prefix() + macro_path(line)
+        return path + (macro,) if macro is not None else path
+
+    def record_render(self, path: tuple[str, ...], elapsed: float):
+        node = self._node(path)
+        node.calls += 1
+        node.render += elapsed
+        if self.stack:
+            self.stack[-1].nested += elapsed
+
+    def begin_dispatch(self, line: GCodeLine) -> DispatchFrame:
+        path = macro_path(line)
+        # lines outside of macros are part of the enclosing line, they only pass the prefix on
+        frame = DispatchFrame(self._prefix() + path, len(path) > 0)
+        self.stack.append(frame)
+        return frame
+
+    def end_dispatch(self, frame: DispatchFrame, elapsed: float):
+        if self.stack and self.stack[-1] is frame:
+            self.stack.pop()
+        if frame.counted:
+            node = self._node(frame.path)
+            node.lines += 1
+            node.dispatch += elapsed - frame.nested
+            if self.stack:
+                self.stack[-1].nested += elapsed
+        elif self.stack:
+            self.stack[-1].nested += frame.nested
+
+    def report(self) -> list[str]:
+        lines = []
+
+        def visit(node: ProfileNode, depth: int):
+            render, count, dispatch = node.inclusive()
+            lines.append(f"{'  ' * depth}{node.name}: calls={node.calls} render={node.render:.3f}/{render:.3f}s "
+                         f"dispatch={node.dispatch:.3f}/{dispatch:.3f}s lines={node.lines}/{count}")
+            for child in sorted(node.children.values(), key=lambda n: sum(n.inclusive()[::2]), reverse=True):
+                visit(child, depth + 1)
+
+        for node in sorted(self.root.children.values(), key=lambda n: sum(n.inclusive()[::2]), reverse=True):
+            visit(node, 0)
+        return lines
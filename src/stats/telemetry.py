@@ -0,0 +1,109 @@
+from __future__ import annotations
+import time
+from typing import Any
+from typing import Optional
+
+# log2 buckets in microseconds, bucket n counts samples in [2^(n-1), 2^n) us, the last one everything above
+HISTOGRAM_BUCKETS = 24
+RATE_INTERVAL = 1.0
+
+
+def histogram_bucket(elapsed: float) -> int:
+    return min(int(elapsed * 1_000_000).bit_length(), HISTOGRAM_BUCKETS - 1)
+
+
+class CommandStats:
+    __slots__ = ('count', 'total', 'max', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def record(self, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        self.histogram[histogram_bucket(elapsed)] += 1
+
+    def get_status(self, histogram: bool = False) -> dict[str, Any]:
+        status = {
+            'count': self.count,
+            'total': round(self.total, 6),
+            'avg': round(self.total / self.count, 6) if self.count else 0.,
+            'max': round(self.max, 6),
+        }
+        if histogram:
+            status['histogram'] = list(self.histogram)
+        return status
+
+
+class Telemetry:
+    enabled: bool
+    commands: dict[str, CommandStats]
+    read: CommandStats
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.clock = time.perf_counter
+        self.reset()
+
+    def reset(self):
+        self.commands = {}
+        self.read = CommandStats()
+        self.lines = 0
+        self.mutex_wait = 0.
+        self.yields = 0
+        self.started = self.clock()
+        self.lines_per_second = 0.
+        self._rate_time = self.started
+        self._rate_lines = 0
+
+    def set_enabled(self, enabled: bool):
+        if enabled and not self.enabled:
+            self.reset()
+        self.enabled = enabled
+
+    def record_command(self, cmd: Optional[str], elapsed: float):
+        self.lines += 1
+        stats = self.commands.get(cmd)
+        if stats is None:
+            stats = self.commands[cmd] = CommandStats()
+        stats.record(elapsed)
+
+    # time spent reading file lines and rendering macros before a line could be dispatched
+    def record_read(self, elapsed: float):
+        self.read.record(elapsed)
+
+    def record_mutex_wait(self, elapsed: float):
+        self.mutex_wait += elapsed
+
+    def record_yield(self):
+        self.yields += 1
+
+    def _update_rate(self):
+        now = self.clock()
+        if now - self._rate_time >= RATE_INTERVAL:
+            self.lines_per_second = (self.lines - self._rate_lines) / (now - self._rate_time)
+            self._rate_time = now
+            self._rate_lines = self.lines
+
+    def get_status(self, histogram: bool = False) -> dict[str, Any]:
+        if self.enabled:
+            self._update_rate()
+        return {
+            'enabled': self.enabled,
+            'lines': self.lines,
+            'lines_per_second': round(self.lines_per_second, 1),
+            'mutex_wait': round(self.mutex_wait, 6),
+            'reactor_yields': self.yields,
+            'read': self.read.get_status(histogram),
+            'commands': {cmd or '': stats.get_status(histogram) for cmd, stats in self.commands.items()},
+        }
+
+    def stats(self) -> str:
+        self._update_rate()
+        return 'lines=%d lines_per_second=%.1f mutex_wait=%.3f reactor_yields=%d read_time=%.3f' % (
+            self.lines, self.lines_per_second, self.mutex_wait, self.yields, self.read.total)
@@ -0,0 +1,52 @@
+# Pause and cancel have to stop the print loop within a bound, whatever the pacing is doing at that moment.
+#
+#   python -m pytest tests
+from __future__ import annotations
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from harness import HeadlessPrinter
+
+STOP_LATENCY_LIMIT = 0.050  # seconds from the request until the print loop stopped
+PAUSES = 5
+
+
+@pytest.fixture(params=['fixed', 'adaptive'])
+def printer(request, tmp_path) -> HeadlessPrinter:
+    gcodes = tmp_path / 'gcodes'
+    gcodes.mkdir()
+    with open(gcodes / 'moves.gcode', 'w') as handle:
+        for i in range(200000):
+            handle.write(f'G1 X{i % 200} Y{i % 200}\n')
+
+    config = tmp_path / 'printer.cfg'
+    config.write_text(f'[gcode_loader]\nbatch_lines: 32\npacing: {request.param}\n\n'
+                      f'[virtual_sdcard]\npath: {gcodes}\n')
+    printer = HeadlessPrinter(str(config), move_time=0.001)
+    printer.load()
+    return printer
+
+
+def test_pause_and_cancel_latency(printer: HeadlessPrinter):
+    printer.run_script('SDCARD_PRINT_FILE FILENAME=moves.gcode')
+    for _ in range(PAUSES):
+        printer.run_for(0.1)
+        printer.run_script('M25')
+        assert printer.get_status('print_stats')['state'] == 'paused'
+        printer.run_script('M24')
+
+    printer.run_for(0.1)
+    assert printer.loader.is_active()
+    printer.call(printer.loader.do_cancel)
+    assert printer.get_status('print_stats')['state'] == 'cancelled'
+
+    latency = printer.get_status('virtual_sdcard')['stop_latency']
+    assert latency['pause']['count'] == PAUSES
+    assert latency['cancel']['count'] == 1
+    assert latency['pause']['max'] < STOP_LATENCY_LIMIT
+    assert latency['cancel']['max'] < STOP_LATENCY_LIMIT